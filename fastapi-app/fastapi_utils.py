@@ -1,21 +1,24 @@
+import gzip
+import hashlib
+import json
 import logging
 import os
 import pandas as pd
-from datetime import datetime, timezone
-from fastapi import FastAPI, HTTPException
-from functools import partial
-from fastapi.responses import JSONResponse
+import pyarrow as pa
+from dataclasses import dataclass
+from email.utils import formatdate, parsedate_to_datetime
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import FileResponse, JSONResponse, Response, StreamingResponse
 from pipelines.mongo.mongo_utils import MongoDBUtils
-from typing import Dict, Any, Callable, List, Optional
-from pymongo.results import UpdateResult
-from pipelines.general.filesystem_utils import CODE_PATH
-from pipelines.transform.process_json_data import (
-    extract_maturity,
-    extract_market_allocation,
-    extract_credit_rate,
-    extract_sector,
-    extract_portfolio_characteristics,
-)
+from pipelines.mongo.etf_status import log_etfs_info_status
+from pipelines.mongo.columnar import COLUMNAR_FORMATS, PARQUET_MEDIA_TYPE, records_to_arrow
+from typing import Dict, Any, Callable, Iterable, Iterator, List, Optional
+from pipelines.general.file_cache import MtimeCachedFile
+from pipelines.general.ref_data import get_ticker_from_isin
+from pipelines.extraction.incremental_refresh import get_refresh_start, select_changed_records
+# Re-exported for main.py
+from pipelines.orchestration.factsheet_processing import process_factsheet
 
 app = FastAPI()
 
@@ -40,155 +43,266 @@ def load_csv_as_records(file_path: str):
         raise HTTPException(status_code=500, detail=f"Unexpected error: {str(e)}")
 
 
+@dataclass
+class CsvPayload:
+    body: bytes
+    gzip_body: bytes
+    etag: str
+    last_modified: float
+
+
+def build_csv_payload(file_path: str) -> CsvPayload:
+    """Serialize a CSV once into the JSON body, its gzip form and validators."""
+    records = load_csv_as_records(file_path)
+    # Same encoding JSONResponse uses
+    body = json.dumps(records, ensure_ascii=False, allow_nan=False, separators=(",", ":")).encode("utf-8")
+    return CsvPayload(
+        body=body,
+        gzip_body=gzip.compress(body, mtime=0),
+        etag=f'"{hashlib.sha256(body).hexdigest()[:32]}"',
+        last_modified=os.path.getmtime(file_path),
+    )
+
+
+def is_not_modified(request: Request, etag: str, last_modified: float) -> bool:
+    """Evaluate If-None-Match, or If-Modified-Since when no ETag was sent."""
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        tags = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+        return "*" in tags or etag in tags
+
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since is not None:
+        try:
+            return int(last_modified) <= parsedate_to_datetime(if_modified_since).timestamp()
+        except (TypeError, ValueError):
+            return False
+
+    return False
+
+
 def make_csv_endpoint(file_path: str):
     """
-    Returns a FastAPI endpoint function that loads a CSV and returns its records.
+    Returns a FastAPI endpoint function that serves a CSV as JSON records.
+
+    The JSON and gzip bodies are built once and rebuilt only when the file
+    changes. Responses carry an ETag and Last-Modified, and conditional
+    requests that still match get a 304 without a body.
     """
+    payload_cache = MtimeCachedFile(file_path, build_csv_payload)
 
-    def endpoint():
-        records = load_csv_as_records(file_path)
-        return JSONResponse(content=records)
+    def endpoint(request: Request):
+        try:
+            payload = payload_cache.get()
+        except FileNotFoundError:
+            raise HTTPException(status_code=404, detail=f"File not found: {file_path}")
+
+        headers = {
+            "ETag": payload.etag,
+            "Last-Modified": formatdate(payload.last_modified, usegmt=True),
+            "Cache-Control": "no-cache",
+            "Vary": "Accept-Encoding",
+        }
+        if is_not_modified(request, payload.etag, payload.last_modified):
+            return Response(status_code=304, headers=headers)
+
+        if "gzip" in request.headers.get("accept-encoding", ""):
+            headers["Content-Encoding"] = "gzip"
+            return Response(content=payload.gzip_body, media_type="application/json", headers=headers)
+        return Response(content=payload.body, media_type="application/json", headers=headers)
 
     return endpoint
 
 
-def extract_element_and_insert_into_mongo(
-    isin: str, element: str, json_save_path: str
-) -> UpdateResult:
-    """
-    Extracts a specified element from a JSON file and upserts it into MongoDB.
+# Files change only when reprocessed, clients may reuse them briefly and then revalidate with the ETag
+FILE_CACHE_CONTROL = "private, max-age=300, must-revalidate"
 
-    Args:
-        isin (str): The ISIN code for the record.
-        element (str): Element type to extract (e.g., "maturity", "sector").
-        json_save_path (str): Path to the JSON file containing the data.
+# Content hashes of served files, kept per path and recomputed when the file changes
+_file_hashes: Dict[str, MtimeCachedFile] = {}
 
-    Returns:
-        UpdateResult: MongoDB upsert result.
 
-    Raises:
-        ValueError: For invalid element types or extraction errors.
-        RuntimeError: For MongoDB operation failures.
-    """
-    function_dict: Dict[str, Callable[[str], Any]] = {
-        "maturity": extract_maturity,
-        "sector": extract_sector,
-        "credit_rate": extract_credit_rate,
-        "market_allocation": extract_market_allocation,
-        "portfolio": extract_portfolio_characteristics,
-    }
+def file_sha256(file_path: str, chunk_size: int = 1024 * 1024) -> str:
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as file:
+        for chunk in iter(lambda: file.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
 
-    # Validate element early
-    if element not in function_dict:
-        raise ValueError(
-            f"Invalid element: {element}. Valid options: {list(function_dict.keys())}"
-        )
 
-    mongodb = MongoDBUtils()
-    result = None
+def file_etag(file_path: str) -> str:
+    """Strong ETag of a file: its SHA-256, hashed once per version of the file."""
+    cached = _file_hashes.get(file_path)
+    if cached is None:
+        cached = _file_hashes.setdefault(file_path, MtimeCachedFile(file_path, file_sha256))
+    return f'"{cached.get()[:32]}"'
+
+
+def file_response(request: Request, file_path: str, media_type: str, filename: Optional[str] = None) -> Response:
+    """
+    Serve a file from disk with validators and byte range support.
 
+    FileResponse streams the file in chunks, or hands the path to the server
+    when it supports zero-copy sends, and answers Range requests (If-Range
+    included) with 206. A matching If-None-Match or If-Modified-Since gets a
+    304 without touching the file.
+
+    Raises:
+        HTTPException: 404 if the file does not exist.
+    """
     try:
-        # Extract data
-        extracted_data = function_dict[element](json_save_path)
-        if not extracted_data:
-            logging.error(f"No data extracted for {element} from {json_save_path}")
-
-        # Prepare and upsert record
-        record_data = {"isin": isin, element: extracted_data or {}}
-        result = mongodb.upsert_record(
-            collection_name=element,
-            record=record_data,
-            unique_keys=["isin"],  # Upsert based on ISIN
-        )
+        etag = file_etag(file_path)
+        last_modified = os.path.getmtime(file_path)
+    except FileNotFoundError:
+        raise HTTPException(status_code=404, detail=f"File not found: {os.path.basename(file_path)}")
 
-        logging.info(f"Upserted {element} for ISIN {isin}: {result.raw_result}")
-        return result
+    headers = {
+        "ETag": etag,
+        "Last-Modified": formatdate(last_modified, usegmt=True),
+        "Cache-Control": FILE_CACHE_CONTROL,
+    }
+    if is_not_modified(request, etag, last_modified):
+        return Response(status_code=304, headers=headers)
+    return FileResponse(
+        file_path, media_type=media_type, headers=headers, filename=filename, content_disposition_type="inline"
+    )
 
-    except Exception as e:
-        logging.error(f"Failed to process {element} for ISIN {isin}: {str(e)}")
-        raise RuntimeError(f"Operation failed: {str(e)}") from e
 
-    finally:
-        mongodb.close_connection()
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
 
+# Other media types clients use for the columnar formats
+COLUMNAR_ALIASES = {
+    "application/x-parquet": PARQUET_MEDIA_TYPE,
+    "application/parquet": PARQUET_MEDIA_TYPE,
+}
 
-def log_etfs_info_status(isin: str, element: str, status: str = "Succeeded"):
-    mongodb = MongoDBUtils()
 
-    info_status = {
-        "isin": isin,
-        "element": element,
-        "status": status,
-        "date": datetime.now(timezone.utc),
-    }
+def negotiate_columnar(accept: str) -> Optional[str]:
+    """Return the columnar (or NDJSON) media type the Accept header asks for, None for JSON."""
+    for media_range in accept.split(","):
+        media_type = media_range.split(";")[0].strip().lower()
+        media_type = COLUMNAR_ALIASES.get(media_type, media_type)
+        if media_type in COLUMNAR_FORMATS or media_type == NDJSON_MEDIA_TYPE:
+            return media_type
+    return None
 
-    mongodb.upsert_record("etf_info_status", info_status, ["isin", "element"])
-    mongodb.close_connection()
 
+def iter_ndjson(records: Iterable[Dict[str, Any]]) -> Iterator[bytes]:
+    """Encode records as newline delimited JSON, one line per record as it is produced."""
+    for record in records:
+        yield json.dumps(jsonable_encoder(record), ensure_ascii=False, separators=(",", ":")).encode("utf-8") + b"\n"
 
-def lookup_etf_ref_data(search_value: str, search_col: str, return_col: str, case_insensitive: bool = False) -> Optional[str]:
+
+def records_response(
+    request: Request,
+    fetch_records: Callable[[], Iterable[Dict[str, Any]]],
+    headers: Optional[Dict[str, str]] = None
+):
     """
-    Internal helper to look up values in the ETF reference data CSV.
+    Serve records as JSON, as NDJSON streamed straight from the records
+    iterator, or as an Arrow IPC stream / Parquet body, as asked for through
+    the Accept header.
+
+    Columnar bodies are built straight from the records iterator, without a
+    DataFrame or JSON step. Records Arrow cannot represent fall back to JSON,
+    so clients should check the response Content-Type.
 
     Args:
-        search_value (str): The value to search for.
-        search_col (str): The column to search in.
-        return_col (str): The column to return from the matching row.
-        case_insensitive (bool): Whether to perform a case-insensitive search.
+        request (Request): Incoming request, only its Accept header is used.
+        fetch_records (Callable[[], Iterable[Dict[str, Any]]]): Returns a fresh
+            records iterator, typically a Mongo cursor.
+        headers (Optional[Dict[str, str]]): Extra response headers.
+    """
+    headers = {**(headers or {}), "Vary": "Accept"}
+    media_type = negotiate_columnar(request.headers.get("accept", ""))
+    if media_type == NDJSON_MEDIA_TYPE:
+        return StreamingResponse(iter_ndjson(fetch_records()), media_type=NDJSON_MEDIA_TYPE, headers=headers)
+    if media_type is not None:
+        try:
+            table = records_to_arrow(fetch_records())
+            return Response(content=COLUMNAR_FORMATS[media_type](table), media_type=media_type, headers=headers)
+        except pa.ArrowException as e:
+            logging.warning(f"Records cannot be served as {media_type}, falling back to JSON: {str(e)}")
+    return JSONResponse(content=jsonable_encoder(list(fetch_records())), headers=headers)
 
-    Returns:
-        Optional[str]: The found value, or None if not found.
+
+def get_mongodb(request: Request) -> MongoDBUtils:
     """
-    csv_path = os.path.join(CODE_PATH, "pipelines/ref_data/etfs_ref_data.csv")
-    df = pd.read_csv(csv_path)
-    # Perform case-insensitive search if requested
-    if case_insensitive:
-        mask = df[search_col].str.upper() == search_value.upper()
-    else:
-        mask = df[search_col] == search_value
-    result = df[mask]
-    if not result.empty:
-        return result[return_col].values[0]
-    return None
+    FastAPI dependency returning a MongoDBUtils bound to the process-wide client.
 
-# Create partial functions for each lookup scenario
-get_isin_from_ticker = partial(lookup_etf_ref_data, search_col="ticker", return_col="isin", case_insensitive=True)
-get_ticker_from_isin = partial(lookup_etf_ref_data, search_col="isin", return_col="ticker", case_insensitive=False)
+    The client is created once in the application lifespan and stored on
+    ``app.state.mongo_client``; closing the returned instance is a no-op.
+    """
+    return MongoDBUtils(client=request.app.state.mongo_client)
 
 
 def etf_data_processor(
-    data_fetcher: Callable[[str], pd.DataFrame],
+    data_fetcher: Callable[..., pd.DataFrame],
     collection_name: str,
-    unique_keys: List[str]
+    unique_keys: List[str],
+    batch_size: int = 1000,
+    incremental: bool = False
 ):
-    def process_data(isin: str):
+    """
+    Builds the processor behind the extraction endpoints.
+
+    When ``incremental`` is set the data fetcher must accept a ``start`` keyword.
+    Only rows from the stored watermark (minus a small overlap) are fetched and
+    only new or changed rows are written, unless ``full_rebuild`` is requested.
+    """
+    def process_data(isin: str, mongodb: MongoDBUtils, full_rebuild: bool = False):
         try:
             # Common pre-processing
             ticker = get_ticker_from_isin(isin)
             if not ticker:
-                log_etfs_info_status(isin, collection_name, "No ticker found")
+                log_etfs_info_status(mongodb, isin, collection_name, "No ticker found")
                 raise HTTPException(404, f"No ticker found for ISIN: {isin}")
 
             # Data fetching
-            df = data_fetcher(ticker)
-            result_dict = df.groupby('ticker').apply(lambda x: x.to_dict(orient='records')).to_dict()
-            mongodb = MongoDBUtils()
-
-            # Assuming result_dict is your dictionary with tickers as keys
-            for ticker, records in result_dict.items():
-                # Insert each record into the collection
-                for record_data in records:
-                    record_data["isin"] = isin
-                    mongodb.upsert_record(collection_name, record_data, unique_keys)
-
-
-            log_etfs_info_status(isin, collection_name)
-            return f"Processed {len(records)} records for {collection_name}"
+            start = None
+            if incremental and not full_rebuild:
+                start = get_refresh_start(mongodb, collection_name, isin)
+
+            df = data_fetcher(ticker, start=start) if incremental else data_fetcher(ticker)
+            records = df.to_dict(orient='records')
+            for record_data in records:
+                record_data["isin"] = isin
+
+            fetched = len(records)
+            # The fetchers return an empty frame when yfinance fails, which only
+            # means "nothing new" when refreshing from a watermark
+            if not fetched and start is None:
+                log_etfs_info_status(mongodb, isin, collection_name, "No data returned")
+                raise HTTPException(500, f"Processing failed: No data returned for ticker {ticker}")
+
+            if start is not None:
+                records = select_changed_records(
+                    mongodb, collection_name, records, unique_keys,
+                    {"isin": isin, "date": {"$gte": start}}
+                )
+
+            batch_results = mongodb.bulk_upsert_records(
+                collection_name, records, unique_keys, batch_size=batch_size
+            )
+
+            inserted = sum(batch["inserted"] for batch in batch_results)
+            modified = sum(batch["modified"] for batch in batch_results)
+            failed = sum(batch["failed"] for batch in batch_results)
+            logging.info(f"Bulk upsert into {collection_name} for ISIN {isin}: {batch_results}")
+
+            if failed:
+                log_etfs_info_status(mongodb, isin, collection_name, f"{failed} records failed to upsert")
+            else:
+                log_etfs_info_status(mongodb, isin, collection_name)
+            mode = f"incremental from {start:%Y-%m-%d}" if start is not None else "full"
+            return (
+                f"Processed {len(records)} of {fetched} fetched records for {collection_name} ({mode}) "
+                f"in {len(batch_results)} batches ({inserted} inserted, {modified} modified, {failed} failed)"
+            )
 
         except HTTPException:
             raise
         except Exception as e:
-            log_etfs_info_status(isin, collection_name, str(e))
+            log_etfs_info_status(mongodb, isin, collection_name, str(e))
             raise HTTPException(500, f"Processing failed: {str(e)}")
 
-    return process_data
\ No newline at end of file
+    return process_data
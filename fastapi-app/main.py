@@ -1,91 +1,172 @@
 import os
-import io
-from fastapi import FastAPI, HTTPException
-from fastapi.responses import StreamingResponse
-from pydantic import BaseModel
-from pipelines.extraction.extract_etfs_factsheet import extract_and_save_pdf, read_pdf_file_to_bytes
+from contextlib import asynccontextmanager
+from datetime import date, datetime, time
+from functools import partial
+from fastapi import FastAPI, HTTPException, Depends, Query, Request
+from pydantic import BaseModel, Field
+from typing import List, Optional
 from pipelines.extraction.extract_etfs_details import get_etf_daily_prices, get_etf_dividends_issued, get_etf_info
-from pipelines.transform.parser_utils import parse_pdf_document, save_json_to_file
+from pipelines.extraction.batch_prices import refresh_prices_batch
+from pipelines.extraction.extract_all import extract_all_details
 from pipelines.general.filesystem_utils import FS_PATH, JSON_PATH, CODE_PATH
-from pipelines.mongo.mongo_utils import MongoDBUtils
-from pipelines.transform.convert_data_uniformization import clean_table
+from pipelines.mongo.mongo_utils import MongoDBUtils, create_mongo_client
+from pipelines.mongo.etf_status import get_etfs_overview
+from pipelines.mongo.pagination import MAX_PAGE_SIZE, parse_fields, parse_filter, plan_page
+from pipelines.orchestration.job_queue import JobQueue
+from pipelines.orchestration.clean_elements import get_clean_element, rematerialize_clean_elements
+from pipelines.orchestration.compare_etfs import compare_etfs
+from pipelines.orchestration.price_series import get_price_series
 from fastapi_utils import (
         make_csv_endpoint,
-        extract_element_and_insert_into_mongo,
         etf_data_processor,
-        log_etfs_info_status
+        records_response,
+        file_response,
+        process_factsheet,
+        get_mongodb
         )
 
-app = FastAPI()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # One pooled client for the whole process, shared by every request
+    app.state.mongo_client = create_mongo_client()
+    # Declared indexes are created once here instead of on every write
+    mongodb = MongoDBUtils(client=app.state.mongo_client)
+    mongodb.ensure_indexes()
+
+    app.state.job_queue = JobQueue(mongodb)
+    app.state.job_queue.register("process_fs_data", partial(process_factsheet, mongodb=mongodb))
+    app.state.job_queue.register("rematerialize_clean", lambda _: rematerialize_clean_elements(mongodb))
+    app.state.job_queue.register("rematerialize_clean_all", lambda _: rematerialize_clean_elements(mongodb, only_stale=False))
+    app.state.job_queue.recover()
+    # Catch up on records cleaned by an older NORMALIZATION_VERSION
+    app.state.job_queue.submit("rematerialize_clean", "all")
+    yield
+    app.state.job_queue.shutdown()
+    app.state.mongo_client.close()
+
+
+app = FastAPI(lifespan=lifespan)
 
 
 class IsinInput(BaseModel):
     isin: str
 
 
-@app.get("/element")
-def get_element_data(isin: str, element:str):
-    # Fetch the maturity record using the helper function
-    mongodb = MongoDBUtils()
-    record = mongodb.retrieve_record(element,{"isin":isin})
-    mongodb.close_connection()
-    print(record)
+class BatchPricesInput(BaseModel):
+    isins: Optional[List[str]] = None  # None refreshes every ETF in etfs_ref_data.csv
+    full_rebuild: bool = False
+    chunk_size: int = Field(50, gt=0)
+    max_workers: int = Field(4, gt=0)
 
-    return record
+
+@app.get("/element")
+def get_element_data(isin: str, element:str, request: Request, mongodb: MongoDBUtils = Depends(get_mongodb)):
+    # JSON by default, Arrow IPC stream or Parquet when the Accept header asks for it
+    return records_response(request, lambda: mongodb.iter_records(element, {"isin": isin}))
 
 
 @app.get("/clean_element")
-def get_element_data_clean(isin:str, element:str):
-    mongodb = MongoDBUtils()
-    record = mongodb.retrieve_record(element,{"isin":isin})
-    
-    mongodb.close_connection()
-    if len(record) == 1:
-        record = {element: clean_table(record[0][element], element)}
-    else:
-        record = None
+def get_element_data_clean(isin:str, element:str, mongodb: MongoDBUtils = Depends(get_mongodb)):
+    # Cleaned at ingestion time, only rebuilt here if missing or outdated
+    clean_record = get_clean_element(isin, element, mongodb)
+    record = {element: clean_record[element]} if clean_record else None
     print(f'Fetching data: {record} \n ----')
     return record 
 
 @app.get("/collection_data")
-def get_collection_data(collection_name:str):
-    # Fetch the maturity record using the helper function
-    mongodb = MongoDBUtils()
-    records = mongodb.retrieve_all_records(collection_name)
-    mongodb.close_connection()
+def get_collection_data(
+    collection_name: str,
+    request: Request,
+    filter_json: Optional[str] = Query(None, alias="filter"),
+    fields: Optional[str] = None,
+    limit: Optional[int] = None,
+    cursor: Optional[str] = None,
+    mongodb: MongoDBUtils = Depends(get_mongodb)
+):
+    """
+    Records of a collection, optionally filtered (extended JSON), projected on
+    comma separated fields and paginated: with a limit, X-Next-Cursor holds the
+    token for the next page. JSON by default; NDJSON (streamed), Arrow IPC
+    stream or Parquet when the Accept header asks for it.
+    """
+    try:
+        query = parse_filter(filter_json)
+        projection = parse_fields(fields)
+        headers = {}
+        sort = None
+        if limit is not None or cursor:
+            query, next_cursor = plan_page(
+                mongodb, collection_name, query, MAX_PAGE_SIZE if limit is None else limit, cursor
+            )
+            sort = [("_id", 1)]
+            if next_cursor:
+                headers["X-Next-Cursor"] = next_cursor
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
 
-    return records
+    return records_response(request, lambda: mongodb.iter_records(collection_name, query, projection, sort), headers)
 
-@app.post("/process_fs_data")
-def process_fs_data(data: IsinInput):
-    isin = data.isin
+@app.get("/etfs_overview")
+def etfs_overview(name: Optional[str] = None, mongodb: MongoDBUtils = Depends(get_mongodb)):
+    """ETF reference data joined to one aggregated processing status per ISIN"""
+    return get_etfs_overview(mongodb, name_filter=name)
 
-    pdf_path = f"{FS_PATH}{isin}_factsheet.pdf"
-    json_save_path = f"{JSON_PATH}{isin}_factsheet.json"
+@app.get("/compare")
+def compare(isins: str, elements: str, mongodb: MongoDBUtils = Depends(get_mongodb)):
+    """Merged comparison tables for comma separated ISINs and elements, one $in query per element"""
+    try:
+        return compare_etfs(
+            [isin.strip() for isin in isins.split(",") if isin.strip()],
+            [element.strip() for element in elements.split(",") if element.strip()],
+            mongodb
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
 
+@app.get("/price_series")
+def price_series(
+    isin: str,
+    start: Optional[date] = None,
+    end: Optional[date] = None,
+    columns: Optional[str] = None,
+    frequency: str = "daily",
+    points: Optional[int] = None,
+    mongodb: MongoDBUtils = Depends(get_mongodb)
+):
+    """Daily prices of an ETF within [start, end], optionally as weekly/monthly bars and LTTB-downsampled to points rows"""
     try:
-        # Check if the PDF already exists, if not, extract and save it
-        if not os.path.exists(pdf_path):
-            extract_and_save_pdf(isin)
+        return get_price_series(
+            mongodb,
+            isin,
+            start=datetime.combine(start, time.min) if start else None,
+            end=datetime.combine(end, time.max) if end else None,
+            columns=[column.strip() for column in columns.split(",") if column.strip()] if columns else None,
+            frequency=frequency,
+            points=points
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
 
-        # Check if the JSON already exists, if not, parse the PDF and save the JSON
-        if not os.path.exists(json_save_path) and os.path.exists(pdf_path):
-            json_data = parse_pdf_document(isin)
-            save_json_to_file(json_data, isin)
+@app.post("/process_fs_data", status_code=202)
+def process_fs_data(data: IsinInput, request: Request):
+    """Queue factsheet processing for an ISIN and return the job to poll"""
+    return request.app.state.job_queue.submit("process_fs_data", data.isin)
 
-        elif not os.path.exists(json_save_path):
-            log_etfs_info_status(isin, "process_fs_data", "No data found")
-            raise HTTPException(404, "FactSheet EN or DE not found")
 
-        # Extract and insert data elements into MongoDB
-        for element in ["maturity", "sector", "credit_rate", "market_allocation", "portfolio"]:
-            extract_element_and_insert_into_mongo(isin, element, json_save_path)
+@app.post("/rematerialize_clean", status_code=202)
+def rematerialize_clean(request: Request, only_stale: bool = True):
+    """Queue a rebuild of the materialized clean element collections"""
+    kind = "rematerialize_clean" if only_stale else "rematerialize_clean_all"
+    return request.app.state.job_queue.submit(kind, "all")
 
-        log_etfs_info_status(isin, "process_fs_data")
-        return "ETF Factsheet Processed"
 
-    except Exception as e:
-        raise HTTPException(500, f"Error processing data: {str(e)}")
+@app.get("/jobs/{job_id}")
+def get_job(job_id: str, request: Request):
+    job = request.app.state.job_queue.get(job_id)
+    if job is None:
+        raise HTTPException(404, f"Job not found: {job_id}")
+    return job
 
 # Define file paths
 country_list_ratings_path = os.path.join(CODE_PATH, "pipelines/ref_data/Country_List_Credit_Ratings.csv")
@@ -103,52 +184,72 @@ app.get("/etfs_list")(make_csv_endpoint(etfs_ref_data_path))
 
 
 @app.post("/extract_prices")
-def extract_daily_prices(isin: str) -> str:
-    """Endpoint wrapper for daily prices extraction"""
+def extract_daily_prices(isin: str, full_rebuild: bool = False, mongodb: MongoDBUtils = Depends(get_mongodb)) -> str:
+    """Endpoint wrapper for daily prices extraction, incremental unless full_rebuild is set"""
     return etf_data_processor(
         data_fetcher=get_etf_daily_prices,
         collection_name="etf_daily_prices",
-        unique_keys=["isin", "date"]
-    )(isin)
+        unique_keys=["isin", "date"],
+        incremental=True
+    )(isin, mongodb, full_rebuild)
 
 @app.post("/extract_dividends")
-def extract_dividends_issued(isin: str) -> str:
-    """Endpoint wrapper for dividends extraction"""
+def extract_dividends_issued(isin: str, full_rebuild: bool = False, mongodb: MongoDBUtils = Depends(get_mongodb)) -> str:
+    """Endpoint wrapper for dividends extraction, incremental unless full_rebuild is set"""
     return etf_data_processor(
         data_fetcher=get_etf_dividends_issued,
         collection_name="etf_dividends_issued",
-        unique_keys=["isin", "date"]
-    )(isin)
+        unique_keys=["isin", "date"],
+        incremental=True
+    )(isin, mongodb, full_rebuild)
 
 @app.post("/extract_info")
-def extract_info(isin: str) -> str:
+def extract_info(isin: str, mongodb: MongoDBUtils = Depends(get_mongodb)) -> str:
     """Endpoint wrapper for general info extraction"""
     return etf_data_processor(
         data_fetcher=get_etf_info,
         collection_name="etf_info",
         unique_keys=["isin"]
-    )(isin)
+    )(isin, mongodb)
+
+@app.post("/extract_all")
+def extract_all(isin: str, full_rebuild: bool = False, mongodb: MongoDBUtils = Depends(get_mongodb)):
+    """Extract prices, dividends and info of an ETF from a single ticker fetch"""
+    try:
+        return extract_all_details(isin, mongodb, full_rebuild=full_rebuild)
+    except LookupError as e:
+        raise HTTPException(404, str(e))
+    except Exception as e:
+        raise HTTPException(500, f"Processing failed: {str(e)}")
+
+@app.post("/extract_prices_batch")
+def extract_daily_prices_batch(data: BatchPricesInput, mongodb: MongoDBUtils = Depends(get_mongodb)):
+    """Refresh daily prices for many ISINs with multi-ticker downloads"""
+    return refresh_prices_batch(
+        mongodb,
+        isins=data.isins,
+        chunk_size=data.chunk_size,
+        max_workers=data.max_workers,
+        full_rebuild=data.full_rebuild
+    )
 
 @app.get("/read_pdf")
-def read_pdf_records(isin: str):
+def read_pdf_records(isin: str, request: Request):
+    """Factsheet PDF of an ISIN, with ETag, Cache-Control and Range support"""
     # Validate the ISIN parameter if necessary
-    if not isin or len(isin) != 12:  # Example validation for ISIN length
+    if not isin or len(isin) != 12 or not isin.isalnum():  # Also keeps the ISIN from escaping FS_PATH
         raise HTTPException(status_code=422, detail="Invalid ISIN provided.")
 
-    pdf_path = f"{FS_PATH}/{isin}_factsheet.pdf"
-    try:
-        pdf_content = read_pdf_file_to_bytes(pdf_path)
-        return StreamingResponse(io.BytesIO(pdf_content), media_type='application/pdf')
-    except FileNotFoundError as e:
-        raise HTTPException(status_code=404, detail=str(e))
-    except Exception as e:
-        raise HTTPException(status_code=500, detail="An error occurred while processing the request.")
+    return file_response(
+        request, f"{FS_PATH}{isin}_factsheet.pdf", media_type="application/pdf", filename=f"{isin}_factsheet.pdf"
+    )
 
 @app.get("/pdf-records")
 def get_pdf_records():
     # Read the CSV file into a DataFrame
     list_of_pdfs = os.listdir(FS_PATH)
-    pdf_records = [ pdf.replace("_factsheet.pdf","") for pdf in list_of_pdfs]
+    # Only the per-ISIN pointers, not the content-addressed store or temporary files
+    pdf_records = [ pdf.removesuffix("_factsheet.pdf") for pdf in list_of_pdfs if pdf.endswith("_factsheet.pdf")]
     return pdf_records
 
 @app.get("/json-records")
@@ -0,0 +1,259 @@
+import argparse
+import time
+import traceback
+import zlib
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from datetime import datetime
+from typing import Any, Dict, Iterator, List, Optional
+import numpy as np
+import pandas as pd
+import yfinance as yf
+from pipelines.general.ref_data import get_tickers_from_isins
+from pipelines.mongo.mongo_utils import MongoDBUtils
+from pipelines.mongo.etf_status import log_etfs_info_status
+from pipelines.extraction.incremental_refresh import get_refresh_start, select_changed_records
+
+
+PRICE_COLUMNS = ["Open", "High", "Low", "Close", "Volume", "Dividends", "Stock Splits", "Capital Gains"]
+
+
+class YFinancePriceSource:
+    """Downloads daily history for many tickers in one yfinance request."""
+
+    def download(self, tickers: List[str], start: Optional[datetime] = None, period: str = "max") -> Dict[str, pd.DataFrame]:
+        if start is not None:
+            df = yf.download(tickers, start=start, group_by="ticker", actions=True, auto_adjust=True,
+                             ignore_tz=False, threads=False, progress=False)
+        else:
+            df = yf.download(tickers, period=period, group_by="ticker", actions=True, auto_adjust=True,
+                             ignore_tz=False, threads=False, progress=False)
+
+        # Keep the exchange-local timestamps Ticker.history returns, so rows written
+        # by either path share the same (isin, date) key
+        frames = {}
+        for ticker in tickers:
+            if isinstance(df.columns, pd.MultiIndex):
+                if ticker not in df.columns.get_level_values(0):
+                    continue
+                frames[ticker] = df[ticker]
+            else:
+                frames[ticker] = df
+        return frames
+
+
+class SyntheticPriceSource:
+    """
+    Offline stand-in for YFinancePriceSource.
+
+    Generates a deterministic random-walk history per ticker so the batch path
+    can be benchmarked without network access.
+    """
+
+    def __init__(self, days: int = 5000, latency: float = 0.0, seed: int = 0):
+        self.days = days
+        self.latency = latency
+        self.seed = seed
+
+    def download(self, tickers: List[str], start: Optional[datetime] = None, period: str = "max") -> Dict[str, pd.DataFrame]:
+        # Simulated round trip, one per multi-ticker request
+        time.sleep(self.latency)
+        index = pd.bdate_range(end=pd.Timestamp.today().normalize(), periods=self.days, tz="UTC", name="Date")
+
+        frames = {}
+        for ticker in tickers:
+            rng = np.random.default_rng(zlib.crc32(ticker.encode()) + self.seed)
+            close = 100 * np.exp(np.cumsum(rng.normal(0, 0.003, len(index))))
+            df = pd.DataFrame({
+                "Open": close * (1 + rng.normal(0, 0.001, len(index))),
+                "High": close * 1.002,
+                "Low": close * 0.998,
+                "Close": close,
+                "Volume": rng.integers(1_000, 100_000, len(index)),
+                "Dividends": 0.0,
+                "Stock Splits": 0.0,
+            }, index=index)
+            # Slice after generating so a ticker's history is the same whatever the start
+            if start is not None:
+                df = df[df.index >= pd.Timestamp(start, tz="UTC")]
+            frames[ticker] = df
+        return frames
+
+
+PRICE_SOURCES = {
+    "yfinance": YFinancePriceSource,
+    "synthetic": SyntheticPriceSource,
+}
+
+
+def chunked(items: List[Any], size: int) -> Iterator[List[Any]]:
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+
+def to_price_records(df: pd.DataFrame, ticker: str, isin: str) -> List[Dict[str, Any]]:
+    """Shapes one ticker's frame like get_etf_daily_prices and returns its records."""
+    df = df.dropna(how="all")
+    df = df[[col for col in PRICE_COLUMNS if col in df.columns]].copy()
+    df["date"] = df.index
+    df["ticker"] = ticker
+    df["isin"] = isin
+    df.reset_index(drop=True, inplace=True)
+    return df.to_dict(orient="records")
+
+
+def refresh_prices_batch(
+    mongodb: Optional[MongoDBUtils],
+    isins: Optional[List[str]] = None,
+    source=None,
+    chunk_size: int = 50,
+    max_workers: int = 4,
+    batch_size: int = 1000,
+    full_rebuild: bool = False
+) -> Dict[str, Any]:
+    """
+    Refreshes daily prices for many ETFs with multi-ticker downloads.
+
+    Tickers are fetched in chunks of ``chunk_size`` on a pool of ``max_workers``
+    threads, with at most two chunks per worker in flight. Each finished chunk is
+    written straight away with one bulk upsert per ticker, incremental from the
+    stored watermark unless ``full_rebuild`` is set.
+
+    Args:
+        mongodb (Optional[MongoDBUtils]): Database handle. When None nothing is
+            read or written, which is useful to benchmark the fetch path.
+        isins (Optional[List[str]]): ISINs to refresh, all listed ETFs when None.
+        source: Object with a ``download(tickers, start)`` method returning
+            a frame per ticker. Defaults to YFinancePriceSource.
+        chunk_size (int): Tickers per download request.
+        max_workers (int): Concurrent download requests.
+        batch_size (int): Operations per bulk_write call.
+        full_rebuild (bool): Ignore stored watermarks and fetch the full history.
+
+    Returns:
+        Dict[str, Any]: Counts, failures and timings for the run.
+    """
+    source = source or YFinancePriceSource()
+    collection_name = "etf_daily_prices"
+    started = time.perf_counter()
+
+    isin_to_ticker = get_tickers_from_isins(isins)
+    # Several ISINs (share classes, listings) may resolve to the same ticker
+    ticker_to_isins: Dict[str, List[str]] = {}
+    for isin, ticker in isin_to_ticker.items():
+        ticker_to_isins.setdefault(ticker, []).append(isin)
+    missing = sorted(set(isins or []) - set(isin_to_ticker))
+
+    starts = {}
+    if mongodb is not None and not full_rebuild:
+        starts = {isin: get_refresh_start(mongodb, collection_name, isin) for isin in isin_to_ticker}
+
+    summary = {
+        "tickers": len(ticker_to_isins), "chunks": 0, "fetched": 0, "written": 0,
+        "inserted": 0, "modified": 0, "failed": 0, "missing_tickers": missing,
+        "errors": {}, "fetch_seconds": 0.0, "write_seconds": 0.0,
+    }
+
+    def fetch_chunk(tickers: List[str]):
+        chunk_starts = [starts.get(isin) for ticker in tickers for isin in ticker_to_isins[ticker]]
+        # One request per chunk, so it must start at the oldest watermark
+        start = None if any(s is None for s in chunk_starts) else min(chunk_starts)
+        fetch_started = time.perf_counter()
+        frames = source.download(tickers, start=start)
+        return tickers, frames, time.perf_counter() - fetch_started
+
+    def write_chunk(tickers: List[str], frames: Dict[str, pd.DataFrame]):
+        for ticker, isin in ((ticker, isin) for ticker in tickers for isin in ticker_to_isins[ticker]):
+            if ticker not in frames:
+                summary["errors"][isin] = "No data returned"
+                if mongodb is not None:
+                    log_etfs_info_status(mongodb, isin, collection_name, "No data returned")
+                continue
+
+            start = starts.get(isin)
+            frame = frames[ticker]
+            if start is not None:
+                # The chunk may have been fetched from an older watermark, keep this ISIN's rows only
+                frame = frame[frame.index >= pd.Timestamp(start, tz="UTC")]
+            records = to_price_records(frame, ticker, isin)
+            summary["fetched"] += len(records)
+            if mongodb is None:
+                continue
+
+            if start is not None:
+                records = select_changed_records(
+                    mongodb, collection_name, records, ["isin", "date"],
+                    {"isin": isin, "date": {"$gte": start}}
+                )
+            batch_results = mongodb.bulk_upsert_records(collection_name, records, ["isin", "date"], batch_size=batch_size)
+            failed = sum(batch["failed"] for batch in batch_results)
+            summary["written"] += len(records)
+            summary["inserted"] += sum(batch["inserted"] for batch in batch_results)
+            summary["modified"] += sum(batch["modified"] for batch in batch_results)
+            summary["failed"] += failed
+            log_etfs_info_status(mongodb, isin, collection_name,
+                                 f"{failed} records failed to upsert" if failed else "Succeeded")
+
+    chunks = iter(chunked(sorted(ticker_to_isins), chunk_size))
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        in_flight = {}
+
+        def submit_next() -> bool:
+            tickers = next(chunks, None)
+            if tickers is None:
+                return False
+            in_flight[executor.submit(fetch_chunk, tickers)] = tickers
+            return True
+
+        while len(in_flight) < 2 * max_workers and submit_next():
+            pass
+
+        while in_flight:
+            done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in done:
+                tickers = in_flight.pop(future)
+                summary["chunks"] += 1
+                try:
+                    _, frames, fetch_seconds = future.result()
+                    summary["fetch_seconds"] += fetch_seconds
+                    write_started = time.perf_counter()
+                    write_chunk(tickers, frames)
+                    summary["write_seconds"] += time.perf_counter() - write_started
+                except Exception as e:
+                    print(traceback.format_exc())
+                    for ticker in tickers:
+                        for isin in ticker_to_isins[ticker]:
+                            summary["errors"][isin] = str(e)
+                submit_next()
+
+    summary["total_seconds"] = time.perf_counter() - started
+    return summary
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Refresh daily prices for many ETFs in multi-ticker batches.")
+    parser.add_argument("isins", nargs="*", help="ISINs to refresh (default: every ETF in etfs_ref_data.csv)")
+    parser.add_argument("--chunk-size", type=int, default=50)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument("--full-rebuild", action="store_true")
+    parser.add_argument("--source", choices=sorted(PRICE_SOURCES), default="yfinance")
+    parser.add_argument("--dry-run", action="store_true", help="Fetch only, do not touch MongoDB")
+    args = parser.parse_args()
+
+    mongodb = None if args.dry_run else MongoDBUtils()
+    try:
+        if mongodb is not None:
+            mongodb.ensure_indexes()
+        result = refresh_prices_batch(
+            mongodb,
+            isins=args.isins or None,
+            source=PRICE_SOURCES[args.source](),
+            chunk_size=args.chunk_size,
+            max_workers=args.workers,
+            batch_size=args.batch_size,
+            full_rebuild=args.full_rebuild,
+        )
+        print(result)
+    finally:
+        if mongodb is not None:
+            mongodb.close_connection()
@@ -0,0 +1,145 @@
+import logging
+import time
+import traceback
+from typing import Any, Dict, List
+import pandas as pd
+import yfinance as yf
+from pipelines.general.ref_data import get_ticker_from_isin
+from pipelines.mongo.mongo_utils import MongoDBUtils
+from pipelines.mongo.etf_status import has_succeeded, log_etfs_info_statuses
+from pipelines.extraction.extract_etfs_details import dividends_from_history, prices_from_history
+from pipelines.extraction.incremental_refresh import get_refresh_start, select_changed_records
+
+
+# Collections written by extract_all_details, with the fields identifying a record
+DETAILS_COLLECTIONS = {
+    "etf_daily_prices": ["isin", "date"],
+    "etf_dividends_issued": ["isin", "date"],
+    "etf_info": ["isin"],
+}
+DATED_COLLECTIONS = ["etf_daily_prices", "etf_dividends_issued"]
+
+
+def _since(history: pd.DataFrame, start) -> pd.DataFrame:
+    """Rows of a history from a watermark on, all of them when there is none."""
+    if start is None:
+        return history
+    return history[history.index >= pd.Timestamp(start, tz="UTC")]
+
+
+def _with_isin(df: pd.DataFrame, isin: str) -> List[Dict[str, Any]]:
+    records = df.to_dict(orient="records")
+    for record in records:
+        record["isin"] = isin
+    return records
+
+
+def extract_all_details(isin: str, mongodb: MongoDBUtils, full_rebuild: bool = False, batch_size: int = 1000) -> Dict[str, Any]:
+    """
+    Extracts daily prices, dividends and info of an ETF from a single yf.Ticker.
+
+    The history is fetched once, from the oldest of the etf_daily_prices and
+    etf_dividends_issued watermarks, and the dividends are taken from its
+    Dividends column rather than from a second request. Each collection only
+    gets the rows from its own watermark on, in one bulk upsert, and a single
+    combined status is logged for the three elements in one write, so the
+    Overview status rules are unchanged.
+
+    An ISIN without stored dividends whose dividends were already fetched
+    successfully (an accumulating ETF) is refreshed from the prices
+    watermark. The history is fetched in full when prices are missing, when
+    dividends were never fetched successfully, or when ``full_rebuild`` is set.
+
+    Args:
+        isin (str): The ISIN to extract.
+        mongodb (MongoDBUtils): Database handle.
+        full_rebuild (bool): Ignore the stored watermark and fetch the full history.
+        batch_size (int): Operations per bulk_write call.
+
+    Returns:
+        Dict[str, Any]: The combined status, fetch mode, timings and, per
+        collection, the fetched, written, inserted, modified and failed counts.
+
+    Raises:
+        LookupError: If no ticker is listed for the ISIN.
+    """
+    elements = list(DETAILS_COLLECTIONS)
+    ticker = get_ticker_from_isin(isin)
+    if not ticker:
+        log_etfs_info_statuses(mongodb, isin, elements, "No ticker found")
+        raise LookupError(f"No ticker found for ISIN: {isin}")
+
+    try:
+        started = time.perf_counter()
+        # Each date-keyed collection has its own watermark, the history must cover the oldest
+        starts = {
+            collection_name: None if full_rebuild else get_refresh_start(mongodb, collection_name, isin)
+            for collection_name in DATED_COLLECTIONS
+        }
+        prices_start, dividends_start = starts["etf_daily_prices"], starts["etf_dividends_issued"]
+        if dividends_start is None and prices_start is not None and has_succeeded(mongodb, isin, "etf_dividends_issued"):
+            # Dividends were fetched before and there were none (accumulating ETF), prices drive the refresh
+            dividends_start = starts["etf_dividends_issued"] = prices_start
+        if prices_start is None or dividends_start is None:
+            start = None
+        else:
+            start = min(prices_start, dividends_start)
+
+        yticker = yf.Ticker(ticker)
+        history = yticker.history(start=start) if start is not None else yticker.history(period="max")
+        records = {
+            "etf_daily_prices": _with_isin(
+                prices_from_history(_since(history, starts["etf_daily_prices"]), ticker), isin
+            ),
+            "etf_dividends_issued": _with_isin(
+                dividends_from_history(history, ticker, start=starts["etf_dividends_issued"]), isin
+            ),
+        }
+
+        errors = []
+        try:
+            info = yticker.get_info()
+            info["ticker"] = ticker
+            records["etf_info"] = _with_isin(pd.DataFrame([info]), isin)
+        except Exception as e:
+            print(traceback.format_exc())
+            errors.append(f"etf_info: {str(e)}")
+            records["etf_info"] = []
+        fetch_seconds = time.perf_counter() - started
+
+        summary: Dict[str, Any] = {
+            "mode": f"incremental from {start:%Y-%m-%d}" if start is not None else "full",
+            "fetch_seconds": fetch_seconds,
+        }
+        for collection_name, unique_keys in DETAILS_COLLECTIONS.items():
+            collection_records = records[collection_name]
+            fetched = len(collection_records)
+            collection_start = starts.get(collection_name)
+            if collection_start is not None:
+                collection_records = select_changed_records(
+                    mongodb, collection_name, collection_records, unique_keys,
+                    {"isin": isin, "date": {"$gte": collection_start}}
+                )
+            batch_results = mongodb.bulk_upsert_records(
+                collection_name, collection_records, unique_keys, batch_size=batch_size
+            )
+            failed = sum(batch["failed"] for batch in batch_results)
+            if failed:
+                errors.append(f"{collection_name}: {failed} records failed to upsert")
+            summary[collection_name] = {
+                "fetched": fetched,
+                "written": len(collection_records),
+                "inserted": sum(batch["inserted"] for batch in batch_results),
+                "modified": sum(batch["modified"] for batch in batch_results),
+                "failed": failed,
+            }
+        summary["total_seconds"] = time.perf_counter() - started
+
+    except Exception as e:
+        log_etfs_info_statuses(mongodb, isin, elements, str(e))
+        raise
+
+    summary["status"] = "; ".join(errors) if errors else "Succeeded"
+    log_etfs_info_statuses(mongodb, isin, elements, summary["status"])
+    logging.info(f"Extracted all details for ISIN {isin}: {summary}")
+    return summary
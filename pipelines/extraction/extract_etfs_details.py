@@ -3,10 +3,14 @@ import pandas as pd
 import traceback
 
 
-def get_etf_daily_prices(ticker, period = 'max') -> pd.DataFrame:
+def get_etf_daily_prices(ticker, period = 'max', start = None) -> pd.DataFrame:
     try:
         yticker = yf.Ticker(ticker)
-        df_prices = yticker.history(period = period)
+        # An explicit start date (incremental refresh) takes precedence over period
+        if start is not None:
+            df_prices = yticker.history(start = start)
+        else:
+            df_prices = yticker.history(period = period)
         df_prices["date"] = df_prices.index
         df_prices["ticker"] = ticker
         df_prices.reset_index(drop=True, inplace = True)
@@ -18,12 +22,14 @@ def get_etf_daily_prices(ticker, period = 'max') -> pd.DataFrame:
     return df_prices
 
 
-def get_etf_dividends_issued(ticker, period = 'max') -> pd.DataFrame:
+def get_etf_dividends_issued(ticker, period = 'max', start = None) -> pd.DataFrame:
     try:
         yticker = yf.Ticker(ticker)
-        df_dividends = pd.DataFrame(yticker.get_dividends())
+        df_dividends = pd.DataFrame(yticker.get_dividends(period = period))
         df_dividends["date"] = df_dividends.index
         df_dividends["date"] = df_dividends["date"].dt.floor('D')
+        if start is not None:
+            df_dividends = df_dividends[df_dividends["date"] >= pd.Timestamp(start, tz = "UTC")]
         df_dividends["ticker"] = ticker
         df_dividends.reset_index(drop=True, inplace = True)
     
@@ -34,6 +40,34 @@ def get_etf_dividends_issued(ticker, period = 'max') -> pd.DataFrame:
     
     return df_dividends
 
+def prices_from_history(history: pd.DataFrame, ticker) -> pd.DataFrame:
+    """Shape a yf.Ticker.history frame like get_etf_daily_prices."""
+    df_prices = history.copy()
+    df_prices["date"] = df_prices.index
+    df_prices["ticker"] = ticker
+    df_prices.reset_index(drop=True, inplace = True)
+    return df_prices
+
+
+def dividends_from_history(history: pd.DataFrame, ticker, start = None) -> pd.DataFrame:
+    """
+    Shape the dividends of a yf.Ticker.history frame like get_etf_dividends_issued.
+
+    The history already carries every dividend in its Dividends column (0 on
+    other days), so no separate dividends request is needed.
+    """
+    if "Dividends" not in history.columns:
+        return pd.DataFrame([],columns=["Dividends","date","ticker"])
+    df_dividends = history.loc[history["Dividends"] != 0, ["Dividends"]].copy()
+    df_dividends["date"] = df_dividends.index
+    df_dividends["date"] = df_dividends["date"].dt.floor('D')
+    if start is not None:
+        df_dividends = df_dividends[df_dividends["date"] >= pd.Timestamp(start, tz = "UTC")]
+    df_dividends["ticker"] = ticker
+    df_dividends.reset_index(drop=True, inplace = True)
+    return df_dividends
+
+
 def get_etf_info(ticker) -> pd.DataFrame:
     try:
         yticker = yf.Ticker(ticker)
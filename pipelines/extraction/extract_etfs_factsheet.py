@@ -1,8 +1,28 @@
+import io
+import os
+import resource
+import tempfile
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from typing import Any, Dict, Optional, Tuple
 import requests
 from bs4 import BeautifulSoup
-from pdf2image import convert_from_bytes
+from pdf2image import convert_from_path
+from PyPDF2 import PdfReader, PdfWriter
+from PyPDF2.errors import PdfReadError
 from pipelines.general.filesystem_utils import FS_PATH
 
+
+# Store factsheets as image-only PDFs instead of the downloaded file
+RASTERIZE_FACTSHEETS = os.getenv("FACTSHEET_RASTERIZE", "0") == "1"
+# Resolution pages are rendered at when rasterizing
+RASTER_DPI = int(os.getenv("FACTSHEET_RASTER_DPI", 200))
+# Processes rendering pages when rasterizing
+RASTER_WORKERS = int(os.getenv("FACTSHEET_RASTER_WORKERS", min(4, os.cpu_count() or 1)))
+# Seconds between RSS samples while storing a factsheet
+RSS_SAMPLE_INTERVAL = 0.01
+
 def extract_factsheet_link(url):
 
     headers = {
@@ -28,20 +48,238 @@ def extract_factsheet_content(factsheet_url:str =  ""):
     return factsheet_information.content
 
 
-def pdf_bytes_to_single_pdf(pdf_bytes, output_pdf_path):
-    # Convert PDF bytes to images
-    images = convert_from_bytes(pdf_bytes)
+def peak_rss_mb(who: int = resource.RUSAGE_SELF) -> float:
+    """Lifetime high-water mark of the resident set size, in MB (ru_maxrss is in kB on Linux)."""
+    return resource.getrusage(who).ru_maxrss / 1024
+
+
+class RssSampler:
+    """
+    Peak resident set size of this process while the block runs.
+
+    ru_maxrss only gives the peak over the whole life of the process, so the
+    current RSS is read from /proc every ``interval`` seconds on a background
+    thread instead. ``growth_mb`` is the peak above the RSS on entry, what the
+    block itself added on top of the process baseline. Both stay None where
+    /proc is not available.
+    """
+
+    def __init__(self, interval: float = RSS_SAMPLE_INTERVAL):
+        self.interval = interval
+        self.start_mb: Optional[float] = None
+        self.peak_mb: Optional[float] = None
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    @staticmethod
+    def current_mb() -> Optional[float]:
+        try:
+            with open("/proc/self/statm") as statm:
+                return int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+        except (OSError, ValueError, IndexError):
+            return None
+
+    def _sample(self):
+        rss = self.current_mb()
+        if rss is not None:
+            self.peak_mb = rss if self.peak_mb is None else max(self.peak_mb, rss)
+
+    @property
+    def growth_mb(self) -> Optional[float]:
+        if self.start_mb is None or self.peak_mb is None:
+            return None
+        return max(self.peak_mb - self.start_mb, 0.0)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self._sample()
+
+    def __enter__(self) -> "RssSampler":
+        self._sample()
+        self.start_mb = self.peak_mb
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._stop.set()
+        self._thread.join()
+        self._sample()
+
+
+def validate_pdf(pdf_bytes: bytes) -> int:
+    """
+    Check that the bytes are a readable PDF.
+
+    Returns:
+        int: Number of pages.
+
+    Raises:
+        ValueError: If the bytes are not a PDF or it has no pages.
+    """
+    # The header may follow up to 1024 bytes of junk
+    if not pdf_bytes or b"%PDF-" not in pdf_bytes[:1024]:
+        raise ValueError("Content is not a PDF")
+    try:
+        pages = len(PdfReader(io.BytesIO(pdf_bytes)).pages)
+    except PdfReadError as e:
+        raise ValueError(f"Invalid PDF: {str(e)}")
+    if not pages:
+        raise ValueError("PDF has no pages")
+    return pages
+
+
+def _write_atomically(content: bytes, output_path: str):
+    """Write to a temporary file next to output_path and move it in place."""
+    directory = os.path.dirname(output_path) or "."
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as file:
+            file.write(content)
+        os.replace(tmp_path, output_path)
+    except BaseException:
+        os.remove(tmp_path)
+        raise
+
+
+def save_original_pdf(pdf_bytes: bytes, output_pdf_path: str) -> int:
+    """
+    Validate the downloaded PDF and store it as is, keeping its text layer.
+
+    Returns:
+        int: Number of pages.
+    """
+    pages = validate_pdf(pdf_bytes)
+    _write_atomically(pdf_bytes, output_pdf_path)
+    return pages
+
+
+def render_page(pdf_path: str, page_number: int, dpi: int) -> bytes:
+    """Render one page (1-based) of a PDF file to a single-page image PDF."""
+    images = convert_from_path(pdf_path, dpi=dpi, first_page=page_number, last_page=page_number)
+    buffer = io.BytesIO()
+    images[0].convert('RGB').save(buffer, format="PDF", resolution=dpi)
+    return buffer.getvalue()
 
-    # Save all images as a single PDF file
-    if images:
-        # Convert images to RGB mode if they are not
-        rgb_images = [image.convert('RGB') for image in images]
-        
-        # Save as a single PDF
-        rgb_images[0].save(output_pdf_path, save_all=True, append_images=rgb_images[1:])
-        print(f"Saved: {output_pdf_path}")
-    else:
-        print("No images to save.")
+
+def _render_page_in_worker(pdf_path: str, page_number: int, dpi: int) -> Tuple[bytes, float]:
+    """
+    render_page on a pool worker, with the worker's peak RSS so far in MB.
+
+    Workers only live for one rasterize_pdf call, so their lifetime peak,
+    including the pdftoppm processes they ran, is the peak of that call.
+    """
+    page_pdf = render_page(pdf_path, page_number, dpi)
+    return page_pdf, max(peak_rss_mb(), peak_rss_mb(resource.RUSAGE_CHILDREN))
+
+
+def rasterize_pdf(
+    pdf_bytes: bytes,
+    output_pdf_path: str,
+    dpi: int = RASTER_DPI,
+    max_workers: int = RASTER_WORKERS
+) -> Tuple[int, Optional[float]]:
+    """
+    Store a PDF as an image-only PDF, rendering it page by page.
+
+    Pages are rendered on a pool of ``max_workers`` processes with at most two
+    pages per worker in flight, and come back as compressed single-page PDFs,
+    so memory is bounded by a few pages whatever the length of the document.
+    With a single worker pages are rendered in this process.
+
+    Returns:
+        Tuple[int, Optional[float]]: Number of pages, and the largest peak RSS
+        of the pool workers in MB (None when rendered in this process).
+    """
+    pages = validate_pdf(pdf_bytes)
+    writer = PdfWriter()
+    workers_peak_mb = None
+
+    with tempfile.NamedTemporaryFile(suffix=".pdf") as source:
+        source.write(pdf_bytes)
+        source.flush()
+
+        if max_workers <= 1:
+            rendered = (render_page(source.name, n, dpi) for n in range(1, pages + 1))
+            for page_pdf in rendered:
+                writer.add_page(PdfReader(io.BytesIO(page_pdf)).pages[0])
+        else:
+            workers_peak_mb = 0.0
+            with ProcessPoolExecutor(max_workers=max_workers) as executor:
+                in_flight = {}
+                done_pages: Dict[int, bytes] = {}
+                next_page = next_to_write = 1
+                while next_to_write <= pages:
+                    while next_page <= pages and len(in_flight) + len(done_pages) < 2 * max_workers:
+                        in_flight[executor.submit(_render_page_in_worker, source.name, next_page, dpi)] = next_page
+                        next_page += 1
+                    done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        page_pdf, worker_peak_mb = future.result()
+                        done_pages[in_flight.pop(future)] = page_pdf
+                        workers_peak_mb = max(workers_peak_mb, worker_peak_mb)
+                    # Append in page order as soon as the next page is available
+                    while next_to_write in done_pages:
+                        page_pdf = done_pages.pop(next_to_write)
+                        writer.add_page(PdfReader(io.BytesIO(page_pdf)).pages[0])
+                        next_to_write += 1
+
+    buffer = io.BytesIO()
+    writer.write(buffer)
+    _write_atomically(buffer.getvalue(), output_pdf_path)
+    return pages, workers_peak_mb
+
+
+def store_factsheet_pdf(
+    pdf_bytes: bytes,
+    output_pdf_path: str,
+    rasterize: bool = RASTERIZE_FACTSHEETS,
+    dpi: int = RASTER_DPI,
+    max_workers: int = RASTER_WORKERS
+) -> Dict[str, Any]:
+    """
+    Store a downloaded factsheet, as is by default or rasterized.
+
+    Args:
+        pdf_bytes (bytes): Downloaded PDF.
+        output_pdf_path (str): Where to write it.
+        rasterize (bool): Render the pages to an image-only PDF instead of
+            keeping the original file.
+        dpi (int): Rendering resolution when rasterizing.
+        max_workers (int): Rendering processes when rasterizing.
+
+    Returns:
+        Dict[str, Any]: Mode, pages, input size, wall time, how far the RSS
+        of this process rose above its level at the start of the call, the
+        absolute peak RSS of the process during the call and, when rendered
+        on a pool, the largest peak RSS of its workers (in MB).
+
+    Raises:
+        ValueError: If the bytes are not a valid PDF.
+    """
+    started = time.perf_counter()
+    workers_peak_mb = None
+    with RssSampler() as sampler:
+        if rasterize:
+            pages, workers_peak_mb = rasterize_pdf(pdf_bytes, output_pdf_path, dpi=dpi, max_workers=max_workers)
+        else:
+            pages = save_original_pdf(pdf_bytes, output_pdf_path)
+
+    metrics = {
+        "mode": f"rasterized at {dpi} dpi" if rasterize else "original",
+        "pages": pages,
+        "bytes": len(pdf_bytes),
+        "wall_seconds": round(time.perf_counter() - started, 3),
+        "rss_growth_mb": round(sampler.growth_mb, 1) if sampler.growth_mb is not None else None,
+        "process_peak_rss_mb": round(sampler.peak_mb, 1) if sampler.peak_mb is not None else None,
+        "workers_peak_rss_mb": round(workers_peak_mb, 1) if workers_peak_mb is not None else None,
+    }
+    print(f"Saved: {output_pdf_path} {metrics}")
+    return metrics
+
+
+def pdf_bytes_to_single_pdf(pdf_bytes, output_pdf_path, dpi: int = RASTER_DPI, max_workers: int = RASTER_WORKERS):
+    """Rasterize a PDF to an image-only PDF, see rasterize_pdf."""
+    return store_factsheet_pdf(pdf_bytes, output_pdf_path, rasterize=True, dpi=dpi, max_workers=max_workers)
 
 
 def read_pdf_file_to_bytes(pdf_path: str):
@@ -51,24 +289,36 @@ def read_pdf_file_to_bytes(pdf_path: str):
     return pdf_bytes
 
 
-def extract_and_save_pdf(isin:str = ""):
+def find_factsheet_url(isin: str = "", lang: str = "EN"):
     just_etf_url = f"https://www.justetf.com/en/etf-profile.html?isin={isin}"
     justetf_soup = extract_factsheet_link(just_etf_url)
 
-    if justetf_soup:
-        for lang in ['EN']:
-            factsheet_element = justetf_soup.find('a', title=f'Factsheet ({lang})')
-            if factsheet_element and 'href' in factsheet_element.attrs:
-                factsheet_url = factsheet_element['href']
-                factsheet_content = extract_factsheet_content(factsheet_url)
-                pdf_bytes_to_single_pdf(factsheet_content,f"{FS_PATH}{isin}_factsheet.pdf")
-                return "Factsheet extracted and save"
-
-            else:
-                return "Not able to find En Factsheet"
-    
-    else:
-        return "Not able to find etf in Just Etf"
+    if not justetf_soup:
+        raise LookupError("Not able to find etf in Just Etf")
+
+    factsheet_element = justetf_soup.find('a', title=f'Factsheet ({lang})')
+    if factsheet_element and 'href' in factsheet_element.attrs:
+        return factsheet_element['href']
+
+    raise LookupError(f"Not able to find {lang.capitalize()} Factsheet")
+
+
+def extract_and_save_pdf(isin:str = "", rasterize: Optional[bool] = None):
+    try:
+        factsheet_url = find_factsheet_url(isin)
+    except LookupError as e:
+        return str(e)
+
+    factsheet_content = extract_factsheet_content(factsheet_url)
+    try:
+        store_factsheet_pdf(
+            factsheet_content,
+            f"{FS_PATH}{isin}_factsheet.pdf",
+            rasterize=RASTERIZE_FACTSHEETS if rasterize is None else rasterize,
+        )
+    except ValueError as e:
+        return str(e)
+    return "Factsheet extracted and save"
 
     
 
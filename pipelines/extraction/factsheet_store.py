@@ -0,0 +1,224 @@
+import hashlib
+import os
+import shutil
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Any, Dict, Optional
+import requests
+from pipelines.extraction.extract_etfs_factsheet import (
+    find_factsheet_url,
+    store_factsheet_pdf,
+    RASTERIZE_FACTSHEETS,
+    RASTER_DPI,
+    RASTER_WORKERS,
+)
+from pipelines.general.filesystem_utils import FACTSHEET_STORE_PATH, FS_PATH
+from pipelines.mongo.mongo_utils import MongoDBUtils
+
+
+# Per-ISIN metadata of the stored factsheets
+FACTSHEETS_COLLECTION = "factsheets"
+
+DOWNLOAD_TIMEOUT = 60
+
+
+def blob_path(sha256: str) -> str:
+    """Content-addressed location of a factsheet, fanned out on the first two hex digits."""
+    return f"{FACTSHEET_STORE_PATH}{sha256[:2]}/{sha256}.pdf"
+
+
+def pointer_path(isin: str) -> str:
+    """The {isin}_factsheet.pdf file the API and the parser read."""
+    return f"{FS_PATH}{isin}_factsheet.pdf"
+
+
+@dataclass
+class FactsheetDownload:
+    """
+    Outcome of checking an ISIN's factsheet against the store.
+
+    ``content`` is only carried when ``changed`` is set, i.e. when the
+    downloaded bytes differ from the stored ones and have to be written.
+    """
+    isin: str
+    source_url: str
+    sha256: Optional[str] = None
+    etag: Optional[str] = None
+    last_modified: Optional[str] = None
+    changed: bool = False
+    content: Optional[bytes] = None
+    store_metrics: Optional[Dict[str, Any]] = None
+
+
+def get_factsheet_record(mongodb: MongoDBUtils, isin: str) -> Optional[Dict[str, Any]]:
+    return mongodb.db[FACTSHEETS_COLLECTION].find_one({"isin": isin}, {"_id": 0})
+
+
+def fetch_factsheet(isin: str, mongodb: MongoDBUtils, force: bool = False) -> FactsheetDownload:
+    """
+    Download an ISIN's factsheet unless the stored one is still current.
+
+    When the factsheet link is the one stored, the download is a conditional
+    GET with the stored ETag and Last-Modified. A 304, or a body with the
+    stored SHA-256 from any link, only refreshes the link, the validators
+    and checked_at.
+
+    Args:
+        isin (str): The ISIN to check.
+        mongodb (MongoDBUtils): Database handle.
+        force (bool): Download unconditionally and treat the content as changed.
+
+    Returns:
+        FactsheetDownload: With the new content when it changed.
+
+    Raises:
+        LookupError: If justETF lists no factsheet for the ISIN.
+        requests.RequestException: If the download fails.
+    """
+    record = get_factsheet_record(mongodb, isin) or {}
+    source_url = find_factsheet_url(isin)
+    stored = (
+        not force
+        and record.get("sha256") is not None
+        and os.path.exists(pointer_path(isin))
+        and os.path.exists(blob_path(record["sha256"]))
+    )
+    # Validators are only meaningful for the link they were received from
+    conditional = stored and record.get("source_url") == source_url
+
+    headers = {}
+    if conditional and record.get("etag"):
+        headers["If-None-Match"] = record["etag"]
+    if conditional and record.get("last_modified"):
+        headers["If-Modified-Since"] = record["last_modified"]
+
+    response = requests.get(source_url, headers=headers, timeout=DOWNLOAD_TIMEOUT)
+    if conditional and response.status_code == 304:
+        download = FactsheetDownload(
+            isin, source_url, record["sha256"],
+            response.headers.get("ETag", record.get("etag")),
+            response.headers.get("Last-Modified", record.get("last_modified")),
+        )
+    else:
+        response.raise_for_status()
+        download = FactsheetDownload(
+            isin, source_url, hashlib.sha256(response.content).hexdigest(),
+            response.headers.get("ETag"), response.headers.get("Last-Modified"),
+        )
+        download.changed = not stored or download.sha256 != record.get("sha256")
+        if download.changed:
+            download.content = response.content
+
+    if not download.changed:
+        mongodb.db[FACTSHEETS_COLLECTION].update_one({"isin": isin}, {"$set": {
+            "source_url": source_url,
+            "etag": download.etag,
+            "last_modified": download.last_modified,
+            "checked_at": datetime.now(timezone.utc),
+        }})
+    return download
+
+
+def write_factsheet_blob(
+    download: FactsheetDownload,
+    rasterize: bool = RASTERIZE_FACTSHEETS,
+    dpi: int = RASTER_DPI,
+    max_workers: int = RASTER_WORKERS
+) -> FactsheetDownload:
+    """
+    Validate and write the downloaded content under its hash, see store_factsheet_pdf.
+
+    Content already in the store, e.g. a factsheet coming back to an older
+    version, is not written again.
+    """
+    path = blob_path(download.sha256)
+    if not os.path.exists(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        download.store_metrics = store_factsheet_pdf(
+            download.content, path, rasterize=rasterize, dpi=dpi, max_workers=max_workers
+        )
+    # The blob is on disk now, no need to carry the bytes further
+    download.content = None
+    return download
+
+
+def _link_pointer(source: str, isin: str):
+    """Point {isin}_factsheet.pdf at a blob, with a hardlink or a copy across filesystems."""
+    target = pointer_path(isin)
+    tmp_path = f"{target}.tmp"
+    if os.path.exists(tmp_path):
+        os.remove(tmp_path)
+    try:
+        os.link(source, tmp_path)
+    except OSError:
+        shutil.copyfile(source, tmp_path)
+    os.replace(tmp_path, target)
+
+
+def publish_factsheet(download: FactsheetDownload, mongodb: MongoDBUtils):
+    """Make a written blob the ISIN's current factsheet and record its metadata."""
+    _link_pointer(blob_path(download.sha256), download.isin)
+    now = datetime.now(timezone.utc)
+    mongodb.upsert_record(FACTSHEETS_COLLECTION, {
+        "isin": download.isin,
+        "source_url": download.source_url,
+        "sha256": download.sha256,
+        "etag": download.etag,
+        "last_modified": download.last_modified,
+        "fetched_at": now,
+        "checked_at": now,
+    }, ["isin"])
+
+
+def refresh_factsheet(
+    isin: str,
+    mongodb: MongoDBUtils,
+    force: bool = False,
+    rasterize: bool = RASTERIZE_FACTSHEETS
+) -> FactsheetDownload:
+    """
+    Bring an ISIN's stored factsheet up to date.
+
+    Returns:
+        FactsheetDownload: ``changed`` tells whether a new version was stored.
+
+    Raises:
+        LookupError: If justETF lists no factsheet for the ISIN.
+        ValueError: If the downloaded content is not a valid PDF.
+        requests.RequestException: If the download fails.
+    """
+    download = fetch_factsheet(isin, mongodb, force=force)
+    if download.changed:
+        write_factsheet_blob(download, rasterize=rasterize)
+        publish_factsheet(download, mongodb)
+    return download
+
+
+def _is_version_done(mongodb: MongoDBUtils, isin: str, sha256: Optional[str], field: str) -> bool:
+    record = get_factsheet_record(mongodb, isin) or {}
+    return sha256 is not None and record.get(field) == sha256
+
+
+def _mark_version_done(mongodb: MongoDBUtils, isin: str, sha256: str, field: str, at_field: str):
+    mongodb.db[FACTSHEETS_COLLECTION].update_one({"isin": isin}, {"$set": {
+        field: sha256,
+        at_field: datetime.now(timezone.utc),
+    }})
+
+
+def is_factsheet_parsed(mongodb: MongoDBUtils, isin: str, sha256: Optional[str]) -> bool:
+    """Whether the parsed JSON on disk comes from this version of the factsheet."""
+    return _is_version_done(mongodb, isin, sha256, "parsed_sha256")
+
+
+def mark_factsheet_parsed(mongodb: MongoDBUtils, isin: str, sha256: str):
+    _mark_version_done(mongodb, isin, sha256, "parsed_sha256", "parsed_at")
+
+
+def is_factsheet_processed(mongodb: MongoDBUtils, isin: str, sha256: Optional[str]) -> bool:
+    """Whether the elements were already extracted from this version of the factsheet."""
+    return _is_version_done(mongodb, isin, sha256, "processed_sha256")
+
+
+def mark_factsheet_processed(mongodb: MongoDBUtils, isin: str, sha256: str):
+    _mark_version_done(mongodb, isin, sha256, "processed_sha256", "processed_at")
@@ -0,0 +1,88 @@
+import math
+import os
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional, Union
+import pandas as pd
+from pipelines.mongo.mongo_utils import MongoDBUtils
+
+
+# Days re-fetched before the stored watermark so late revisions are picked up
+WATERMARK_OVERLAP_DAYS = int(os.getenv("WATERMARK_OVERLAP_DAYS", 5))
+
+
+def get_refresh_start(
+    mongodb: MongoDBUtils,
+    collection_name: str,
+    isin: str,
+    overlap_days: int = WATERMARK_OVERLAP_DAYS
+) -> Optional[datetime]:
+    """
+    Returns the date an incremental refresh should fetch from.
+
+    Args:
+        mongodb (MongoDBUtils): Database handle.
+        collection_name (str): Date-keyed collection (e.g. "etf_daily_prices").
+        isin (str): The ISIN to look up.
+        overlap_days (int): Days to step back from the latest stored date.
+
+    Returns:
+        Optional[datetime]: Watermark minus the overlap, or None when nothing is
+        stored yet and a full history is needed.
+    """
+    latest_date = mongodb.get_latest_value(collection_name, {"isin": isin}, "date")
+    if latest_date is None:
+        return None
+    return latest_date - timedelta(days=overlap_days)
+
+
+def _normalize_value(value: Any) -> Any:
+    """Bring a value to the form it has once read back from MongoDB."""
+    if isinstance(value, pd.Timestamp):
+        value = value.to_pydatetime()
+    if isinstance(value, datetime) and value.tzinfo is not None:
+        # MongoDB stores datetimes as naive UTC
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    if isinstance(value, float) and math.isnan(value):
+        return None
+    return value
+
+
+def select_changed_records(
+    mongodb: MongoDBUtils,
+    collection_name: str,
+    records: List[Dict[str, Any]],
+    unique_keys: Union[str, List[str]],
+    query: Dict[str, Any]
+) -> List[Dict[str, Any]]:
+    """
+    Drops the records that are already stored with identical values.
+
+    Args:
+        mongodb (MongoDBUtils): Database handle.
+        collection_name (str): Collection the records are written to.
+        records (List[Dict[str, Any]]): Freshly fetched records.
+        unique_keys (Union[str, List[str]]): Fields identifying a record.
+        query (Dict[str, Any]): Filter covering the stored records the fetch
+            overlaps with, e.g. {"isin": isin, "date": {"$gte": start}}.
+
+    Returns:
+        List[Dict[str, Any]]: Records that are new or differ from the stored ones.
+    """
+    key_fields = [unique_keys] if isinstance(unique_keys, str) else unique_keys
+
+    stored = {
+        tuple(_normalize_value(record.get(field)) for field in key_fields): record
+        for record in mongodb.retrieve_record(collection_name, query)
+    }
+
+    changed = []
+    for record in records:
+        key = tuple(_normalize_value(record.get(field)) for field in key_fields)
+        stored_record = stored.get(key)
+        if stored_record is None or any(
+            _normalize_value(value) != _normalize_value(stored_record.get(field))
+            for field, value in record.items()
+        ):
+            changed.append(record)
+
+    return changed
@@ -0,0 +1,38 @@
+import os
+import threading
+from typing import Any, Callable, Optional, Tuple
+
+
+class MtimeCachedFile:
+    """
+    Holds a value loaded from a file and reloads it only when the file changes.
+
+    The file is considered changed when its modification time or size differ
+    from the ones seen at the last load, so each ``get`` costs one ``os.stat``.
+    """
+
+    def __init__(self, path: str, loader: Callable[[str], Any]):
+        self.path = path
+        self.loader = loader
+        self._value = None
+        self._version: Optional[Tuple[int, int]] = None
+        self._lock = threading.Lock()
+
+    @property
+    def version(self) -> Optional[Tuple[int, int]]:
+        """(mtime_ns, size) of the file when the cached value was loaded."""
+        return self._version
+
+    def get(self) -> Any:
+        stat = os.stat(self.path)
+        version = (stat.st_mtime_ns, stat.st_size)
+        if version != self._version:
+            with self._lock:
+                if version != self._version:
+                    self._value = self.loader(self.path)
+                    self._version = version
+        return self._value
+
+    def invalidate(self):
+        with self._lock:
+            self._version = None
@@ -2,3 +2,5 @@ DATA_PATH = "/app/data/"
 CODE_PATH = "/app/code/"
 FS_PATH = f"{DATA_PATH}factsheet/"
 JSON_PATH = f"{DATA_PATH}json/"
+# Factsheet PDFs by SHA-256 of the downloaded bytes; FS_PATH/{isin}_factsheet.pdf links to the current one
+FACTSHEET_STORE_PATH = f"{FS_PATH}sha256/"
@@ -0,0 +1,76 @@
+import os
+from typing import Dict, Iterable, List, Optional
+import pandas as pd
+from pipelines.general.file_cache import MtimeCachedFile
+from pipelines.general.filesystem_utils import CODE_PATH
+
+
+ETFS_REF_DATA_PATH = os.path.join(CODE_PATH, "pipelines/ref_data/etfs_ref_data.csv")
+
+
+class EtfRefDataIndex:
+    """
+    ISIN and ticker lookups over the ETF reference data.
+
+    Both directions are plain dictionaries built once per load; ticker lookups
+    are case-insensitive. When a value appears in several rows the first row
+    wins, as with the previous DataFrame scan.
+    """
+
+    def __init__(self, df: pd.DataFrame):
+        self.df = df
+        self._isin_to_ticker: Dict[str, str] = {}
+        self._ticker_to_isin: Dict[str, str] = {}
+        for isin, ticker in zip(df["isin"], df["ticker"]):
+            if pd.isna(isin) or pd.isna(ticker):
+                continue
+            self._isin_to_ticker.setdefault(isin, ticker)
+            self._ticker_to_isin.setdefault(ticker.upper(), isin)
+
+    @classmethod
+    def from_csv(cls, path: str = ETFS_REF_DATA_PATH) -> "EtfRefDataIndex":
+        return cls(pd.read_csv(path))
+
+    def isins(self) -> List[str]:
+        """Every ISIN listed in the reference data, in file order."""
+        return self.df["isin"].dropna().drop_duplicates().tolist()
+
+    def ticker_for(self, isin: str) -> Optional[str]:
+        return self._isin_to_ticker.get(isin)
+
+    def isin_for(self, ticker: str) -> Optional[str]:
+        return self._ticker_to_isin.get(ticker.upper())
+
+    def tickers_for(self, isins: Optional[Iterable[str]] = None) -> Dict[str, str]:
+        """
+        Resolves many ISINs at once.
+
+        Args:
+            isins (Optional[Iterable[str]]): ISINs to resolve, every ISIN when None.
+
+        Returns:
+            Dict[str, str]: ISIN to ticker for the ISINs that have a ticker.
+        """
+        if isins is None:
+            return dict(self._isin_to_ticker)
+        return {isin: self._isin_to_ticker[isin] for isin in isins if isin in self._isin_to_ticker}
+
+
+_etf_ref_data = MtimeCachedFile(ETFS_REF_DATA_PATH, EtfRefDataIndex.from_csv)
+
+
+def get_etf_ref_data() -> EtfRefDataIndex:
+    """The ETF reference data index, reloaded when etfs_ref_data.csv changes."""
+    return _etf_ref_data.get()
+
+
+def get_ticker_from_isin(isin: str) -> Optional[str]:
+    return get_etf_ref_data().ticker_for(isin)
+
+
+def get_isin_from_ticker(ticker: str) -> Optional[str]:
+    return get_etf_ref_data().isin_for(ticker)
+
+
+def get_tickers_from_isins(isins: Optional[Iterable[str]] = None) -> Dict[str, str]:
+    return get_etf_ref_data().tickers_for(isins)
@@ -0,0 +1,56 @@
+import io
+from itertools import islice
+from typing import Any, Dict, Iterable
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+
+ARROW_STREAM_MEDIA_TYPE = "application/vnd.apache.arrow.stream"
+PARQUET_MEDIA_TYPE = "application/vnd.apache.parquet"
+
+# Records converted to Arrow at a time while draining a cursor
+ARROW_CHUNK_SIZE = 10000
+
+
+def records_to_arrow(records: Iterable[Dict[str, Any]], chunk_size: int = ARROW_CHUNK_SIZE) -> pa.Table:
+    """
+    Build an Arrow table from records, typically a Mongo cursor, chunk by chunk.
+
+    Each chunk becomes a record batch without going through a DataFrame or JSON.
+    Columns missing from some records are null there, and types differing
+    between chunks (int then float, null then string) are promoted.
+
+    Raises:
+        pa.ArrowException: When a field holds values Arrow cannot unify.
+    """
+    records = iter(records)
+    tables = []
+    while True:
+        chunk = list(islice(records, chunk_size))
+        if not chunk:
+            break
+        tables.append(pa.Table.from_pylist(chunk))
+    if not tables:
+        return pa.table({})
+    return pa.concat_tables(tables, promote_options="permissive")
+
+
+def arrow_to_ipc_stream(table: pa.Table) -> bytes:
+    """Serialize a table as an Arrow IPC stream."""
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue().to_pybytes()
+
+
+def arrow_to_parquet(table: pa.Table) -> bytes:
+    """Serialize a table as a Parquet file."""
+    buffer = io.BytesIO()
+    pq.write_table(table, buffer)
+    return buffer.getvalue()
+
+
+COLUMNAR_FORMATS = {
+    ARROW_STREAM_MEDIA_TYPE: arrow_to_ipc_stream,
+    PARQUET_MEDIA_TYPE: arrow_to_parquet,
+}
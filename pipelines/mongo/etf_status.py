@@ -0,0 +1,112 @@
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterable, List, Optional
+from pipelines.general.ref_data import get_etf_ref_data
+from pipelines.mongo.mongo_utils import MongoDBUtils
+
+
+# Steps logging a status per ETF; an ETF is fully processed when all succeeded
+STATUS_ELEMENTS = ["process_fs_data", "etf_daily_prices", "etf_dividends_issued", "etf_info"]
+SUCCEEDED = "Succeeded"
+NO_PROCESS_ATTEMPT = "No Process attempt"
+
+
+def log_etfs_info_status(mongodb: MongoDBUtils, isin: str, element: str, status: str = "Succeeded"):
+    info_status = {
+        "isin": isin,
+        "element": element,
+        "status": status,
+        "date": datetime.now(timezone.utc),
+    }
+
+    mongodb.upsert_record("etf_info_status", info_status, ["isin", "element"])
+
+
+def log_etfs_info_statuses(mongodb: MongoDBUtils, isin: str, elements: Iterable[str], status: str = "Succeeded"):
+    """Log one status for several elements of an ETF in a single bulk write."""
+    now = datetime.now(timezone.utc)
+    info_statuses = [
+        {"isin": isin, "element": element, "status": status, "date": now}
+        for element in elements
+    ]
+    mongodb.bulk_upsert_records("etf_info_status", info_statuses, ["isin", "element"])
+
+
+def has_succeeded(mongodb: MongoDBUtils, isin: str, element: str) -> bool:
+    """Whether the last logged status of an ETF's element is a success."""
+    return mongodb.record_exists("etf_info_status", {"isin": isin, "element": element, "status": SUCCEEDED})
+
+
+def status_summary_pipeline(isins: Optional[Iterable[str]] = None) -> List[Dict[str, Any]]:
+    """
+    Aggregation summarizing etf_info_status into one document per ISIN.
+
+    Each document has the overall status_result (same rules the Overview page
+    applied client-side), the latest status date and the per-element
+    breakdown. The leading sort walks the (isin, element) index.
+    """
+    expected = len(STATUS_ELEMENTS)
+    pipeline: List[Dict[str, Any]] = []
+    if isins is not None:
+        pipeline.append({"$match": {"isin": {"$in": list(isins)}}})
+    pipeline += [
+        {"$sort": {"isin": 1, "element": 1}},
+        {"$group": {
+            "_id": "$isin",
+            "elements": {"$push": {"k": "$element", "v": {"status": "$status", "date": "$date"}}},
+            "succeeded": {"$sum": {"$cond": [{"$eq": ["$status", SUCCEEDED]}, 1, 0]}},
+            "total": {"$sum": {"$cond": [{"$ifNull": ["$status", False]}, 1, 0]}},
+            "last_updated": {"$max": "$date"},
+        }},
+        {"$project": {
+            "_id": 0,
+            "isin": "$_id",
+            "status_result": {"$switch": {
+                "branches": [
+                    {"case": {"$gt": ["$total", expected]}, "then": "Error Processing"},
+                    {"case": {"$ne": ["$succeeded", "$total"]}, "then": "Error Processing"},
+                    {"case": {"$eq": ["$total", expected]}, "then": SUCCEEDED},
+                ],
+                "default": "Missing elements",
+            }},
+            "last_updated": 1,
+            "elements": {"$arrayToObject": "$elements"},
+        }},
+    ]
+    return pipeline
+
+
+def summarize_etfs_status(mongodb: MongoDBUtils, isins: Optional[Iterable[str]] = None) -> Dict[str, Dict[str, Any]]:
+    """Run status_summary_pipeline and index the summaries by ISIN."""
+    summaries = mongodb.db["etf_info_status"].aggregate(status_summary_pipeline(isins))
+    return {summary["isin"]: summary for summary in summaries}
+
+
+def get_etfs_overview(mongodb: MongoDBUtils, name_filter: Optional[str] = None) -> List[Dict[str, Any]]:
+    """
+    The ETF reference data joined to each ETF's summarized processing status.
+
+    Args:
+        mongodb (MongoDBUtils): Database handle.
+        name_filter (Optional[str]): Case-insensitive substring the ETF name must contain.
+
+    Returns:
+        List[Dict[str, Any]]: One record per ETF in reference data order, with
+        the reference columns plus status_result, last_updated and elements.
+        ETFs without any status get status_result "No Process attempt".
+    """
+    ref_df = get_etf_ref_data().df
+    if name_filter:
+        ref_df = ref_df[ref_df["name"].str.contains(name_filter, case=False, na=False, regex=False)]
+    ref_records = ref_df.fillna(value="NA").to_dict(orient="records")
+
+    summaries = summarize_etfs_status(mongodb, [record["isin"] for record in ref_records])
+    overview = []
+    for record in ref_records:
+        summary = summaries.get(record["isin"], {})
+        overview.append({
+            **record,
+            "status_result": summary.get("status_result", NO_PROCESS_ATTEMPT),
+            "last_updated": summary.get("last_updated"),
+            "elements": summary.get("elements", {}),
+        })
+    return overview
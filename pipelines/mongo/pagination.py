@@ -0,0 +1,140 @@
+import base64
+import binascii
+import json
+import re
+from typing import Any, Dict, List, Optional, Tuple
+from bson import ObjectId, json_util
+from bson.regex import Regex
+from bson.errors import InvalidId
+from pipelines.mongo.mongo_utils import MongoDBUtils
+
+
+# Largest page a client may ask for
+MAX_PAGE_SIZE = 10000
+
+# Query operators accepted in client supplied filters; anything running code
+# on the server ($where, $function, $expr, ...) is rejected, and so is $regex,
+# whose unanchored or pathological patterns force costly collection scans
+ALLOWED_FILTER_OPERATORS = {
+    "$eq", "$ne", "$gt", "$gte", "$lt", "$lte", "$in", "$nin", "$exists",
+    "$and", "$or", "$nor", "$not", "$size", "$all", "$elemMatch",
+}
+
+
+def encode_cursor(collection_name: str, last_id: ObjectId) -> str:
+    """Opaque token pointing after the last document of a page."""
+    payload = json.dumps({"c": collection_name, "id": str(last_id)}, separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+
+def decode_cursor(collection_name: str, token: str) -> ObjectId:
+    """
+    Read a token made by encode_cursor.
+
+    Raises:
+        ValueError: If the token is malformed or was issued for another collection.
+    """
+    try:
+        padded = token + "=" * (-len(token) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        if payload["c"] != collection_name:
+            raise ValueError(f"Cursor was issued for collection {payload['c']}")
+        return ObjectId(payload["id"])
+    except (binascii.Error, UnicodeDecodeError, json.JSONDecodeError, KeyError, TypeError, InvalidId):
+        raise ValueError("Invalid cursor")
+
+
+def _check_operators(value: Any):
+    # Extended JSON turns {"$regex": ...} and {"$regularExpression": ...} into regex values
+    if isinstance(value, (Regex, re.Pattern)):
+        raise ValueError("Regular expressions are not allowed in filters")
+    if isinstance(value, dict):
+        for key, item in value.items():
+            if key.startswith("$") and key not in ALLOWED_FILTER_OPERATORS:
+                raise ValueError(f"Filter operator not allowed: {key}")
+            _check_operators(item)
+    elif isinstance(value, list):
+        for item in value:
+            _check_operators(item)
+
+
+def parse_filter(filter_json: Optional[str]) -> Dict[str, Any]:
+    """
+    Parse a client filter written as (extended) JSON, e.g.
+    ``{"isin": "IE00B3F81R35", "date": {"$gte": {"$date": "2024-01-01T00:00:00Z"}}}``.
+
+    Raises:
+        ValueError: If it is not a JSON object or uses an operator outside
+            ALLOWED_FILTER_OPERATORS.
+    """
+    if not filter_json:
+        return {}
+    try:
+        query = json_util.loads(filter_json)
+    except (ValueError, TypeError) as e:
+        raise ValueError(f"Invalid filter: {str(e)}")
+    if not isinstance(query, dict):
+        raise ValueError("Filter must be a JSON object")
+    _check_operators(query)
+    return query
+
+
+def parse_fields(fields: Optional[str]) -> Optional[Dict[str, int]]:
+    """Turn a comma separated field list into a projection, None for every field."""
+    names = [name.strip() for name in (fields or "").split(",") if name.strip()]
+    return {name: 1 for name in names} or None
+
+
+def plan_page(
+    mongodb: MongoDBUtils,
+    collection_name: str,
+    query: Dict[str, Any],
+    limit: int,
+    cursor: Optional[str] = None
+) -> Tuple[Dict[str, Any], Optional[str]]:
+    """
+    Keyset pagination on _id.
+
+    The page is the ``limit`` documents following the cursor in _id order. Its
+    last _id is looked up first on the _id index, so the page query is a
+    bounded _id range and the next cursor is known before any document is
+    sent, which lets the page itself be streamed.
+
+    Args:
+        mongodb (MongoDBUtils): Database handle.
+        collection_name (str): Collection to page through.
+        query (Dict[str, Any]): Filter the pages apply.
+        limit (int): Page size, at most MAX_PAGE_SIZE.
+        cursor (Optional[str]): Token from the previous page, None for the first.
+
+    Returns:
+        Tuple[Dict[str, Any], Optional[str]]: The page query, to be read sorted
+        by _id, and the next cursor (None once the last page is reached).
+
+    Raises:
+        ValueError: On an invalid cursor or limit.
+    """
+    if not 1 <= limit <= MAX_PAGE_SIZE:
+        raise ValueError(f"limit must be between 1 and {MAX_PAGE_SIZE}")
+
+    id_range: Dict[str, Any] = {}
+    if cursor:
+        id_range["$gt"] = decode_cursor(collection_name, cursor)
+
+    def with_id_range() -> Dict[str, Any]:
+        conditions: List[Dict[str, Any]] = [query] if query else []
+        if id_range:
+            conditions.append({"_id": dict(id_range)})
+        if len(conditions) > 1:
+            return {"$and": conditions}
+        return conditions[0] if conditions else {}
+
+    boundary = list(
+        mongodb.db[collection_name].find(with_id_range(), {"_id": 1}).sort("_id", 1).skip(limit - 1).limit(1)
+    )
+    if not boundary:
+        # Fewer than limit documents left, this is the last page
+        return with_id_range(), None
+
+    id_range["$lte"] = boundary[0]["_id"]
+    return with_id_range(), encode_cursor(collection_name, boundary[0]["_id"])
@@ -0,0 +1,90 @@
+import threading
+from typing import Dict, List, Tuple
+from pymongo import ASCENDING, IndexModel
+from pymongo.database import Database
+
+
+# Collections written by extract_element_and_insert_into_mongo, one document per ISIN
+ELEMENT_COLLECTIONS = ["maturity", "sector", "credit_rate", "market_allocation", "portfolio"]
+
+# Declared indexes per collection: (key fields, unique)
+COLLECTION_INDEXES: Dict[str, List[Tuple[List[str], bool]]] = {
+    **{element: [(["isin"], True)] for element in ELEMENT_COLLECTIONS},
+    # Cleaned elements materialized at ingestion time
+    **{f"{element}_clean": [(["isin"], True)] for element in ELEMENT_COLLECTIONS},
+    "etf_daily_prices": [(["isin", "date"], True)],
+    "etf_dividends_issued": [(["isin", "date"], True)],
+    "etf_info": [(["isin"], True)],
+    "etf_info_status": [(["isin", "element"], True)],
+    # Factsheet store metadata, one document per ISIN
+    "factsheets": [(["isin"], True)],
+    "jobs": [(["job_id"], True), (["status"], False)],
+}
+
+
+class SchemaRegistry:
+    """
+    Declarative registry of the indexes each collection needs.
+
+    Indexes are created once (normally at application startup) through
+    ``apply`` and remembered per database, so read and write paths never
+    have to issue index DDL themselves.
+    """
+
+    def __init__(self, indexes: Dict[str, List[Tuple[List[str], bool]]] = None):
+        self._indexes: Dict[str, List[IndexModel]] = {}
+        self._applied = set()
+        self._lock = threading.Lock()
+        for collection_name, specs in (indexes or {}).items():
+            for keys, unique in specs:
+                self.register(collection_name, keys, unique)
+
+    def register(self, collection_name: str, keys: List[str], unique: bool = False):
+        """Declare an ascending index on ``keys`` for a collection."""
+        model = IndexModel([(field, ASCENDING) for field in keys], unique=unique)
+        self._indexes.setdefault(collection_name, []).append(model)
+
+    def declared(self, collection_name: str) -> List[str]:
+        """Names of the indexes declared for a collection."""
+        return [model.document["name"] for model in self._indexes.get(collection_name, [])]
+
+    def is_applied(self, db: Database, collection_name: str) -> bool:
+        """Whether every declared index of the collection is known to exist."""
+        return all(
+            (db.name, collection_name, name) in self._applied
+            for name in self.declared(collection_name)
+        )
+
+    def apply(self, db: Database) -> Dict[str, List[str]]:
+        """
+        Create every declared index that is not yet known to exist.
+
+        Args:
+            db (Database): Database to bootstrap.
+
+        Returns:
+            Dict[str, List[str]]: Index names created per collection by this call.
+        """
+        created = {}
+        with self._lock:
+            for collection_name, models in self._indexes.items():
+                pending = [
+                    model for model in models
+                    if (db.name, collection_name, model.document["name"]) not in self._applied
+                ]
+                if not pending:
+                    continue
+
+                collection = db[collection_name]
+                existing = collection.index_information()
+                missing = [model for model in pending if model.document["name"] not in existing]
+                if missing:
+                    created[collection_name] = collection.create_indexes(missing)
+
+                for model in pending:
+                    self._applied.add((db.name, collection_name, model.document["name"]))
+
+        return created
+
+
+schema_registry = SchemaRegistry(COLLECTION_INDEXES)
@@ -0,0 +1,191 @@
+import logging
+from typing import Any, Dict, Iterable, List, Optional
+import numpy as np
+import pandas as pd
+from pipelines.mongo.mongo_utils import MongoDBUtils
+from pipelines.mongo.schema_registry import ELEMENT_COLLECTIONS
+from pipelines.transform.bulk_normalization import CLASSIFIERS, bulk_to_tables, normalize_bulk
+from pipelines.transform.convert_data_uniformization import NORMALIZATION_VERSION, clean_table
+
+
+def clean_collection_name(element: str) -> str:
+    """Collection holding the cleaned (materialized) version of an element."""
+    return f"{element}_clean"
+
+
+def to_document(value: Any) -> Any:
+    """Convert clean_table output (numpy scalars, DataFrames) into BSON-friendly values."""
+    if isinstance(value, pd.DataFrame):
+        return to_document(value.to_dict(orient="records"))
+    if isinstance(value, dict):
+        return {str(key): to_document(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [to_document(item) for item in value]
+    if isinstance(value, np.generic):
+        return value.item()
+    return value
+
+
+def build_clean_record(isin: str, element: str, raw_table: Dict[str, Any]) -> Dict[str, Any]:
+    """Clean a raw element table and tag it with the normalization version."""
+    return {
+        "isin": isin,
+        element: to_document(clean_table(raw_table, element)),
+        "normalization_version": NORMALIZATION_VERSION,
+    }
+
+
+def materialize_clean_element(isin: str, element: str, raw_table: Dict[str, Any], mongodb: MongoDBUtils) -> Optional[Dict[str, Any]]:
+    """
+    Store the cleaned version of a raw element table.
+
+    Cleaning failures are logged and leave the materialized record untouched,
+    the raw element is still available.
+
+    Returns:
+        Optional[Dict[str, Any]]: The stored clean record, or None on failure.
+    """
+    try:
+        record = build_clean_record(isin, element, raw_table)
+    except Exception as e:
+        logging.error(f"Failed to clean {element} for ISIN {isin}: {str(e)}")
+        return None
+
+    mongodb.upsert_record(clean_collection_name(element), record, ["isin"])
+    return record
+
+
+def get_clean_element(isin: str, element: str, mongodb: MongoDBUtils) -> Optional[Dict[str, Any]]:
+    """
+    Read the materialized clean record of an ISIN.
+
+    Records missing or built with an older normalization version are
+    materialized on the spot from the raw element.
+    """
+    records = mongodb.retrieve_record(clean_collection_name(element), {"isin": isin})
+    if records and records[0].get("normalization_version") == NORMALIZATION_VERSION:
+        return records[0]
+
+    raw_records = mongodb.retrieve_record(element, {"isin": isin})
+    if len(raw_records) != 1:
+        return None
+    return materialize_clean_element(isin, element, raw_records[0][element], mongodb)
+
+
+def get_clean_elements(isins: Iterable[str], element: str, mongodb: MongoDBUtils) -> Dict[str, Any]:
+    """
+    Batched get_clean_element: the clean tables of many ISINs in one $in query.
+
+    Missing or outdated records are rebuilt together from a second $in query
+    on the raw collection.
+
+    Returns:
+        Dict[str, Any]: ISIN to clean table, in the order of isins, leaving out
+        ISINs without a raw record.
+    """
+    isins = list(dict.fromkeys(isins))
+    tables = {
+        record["isin"]: record[element]
+        for record in mongodb.retrieve_records_in(clean_collection_name(element), "isin", isins)
+        if record.get("normalization_version") == NORMALIZATION_VERSION and element in record
+    }
+
+    missing = [isin for isin in isins if isin not in tables]
+    if missing:
+        raw_records = [record for record in mongodb.retrieve_records_in(element, "isin", missing) if element in record]
+        if element in CLASSIFIERS:
+            records, _ = _build_clean_records_bulk(raw_records, element)
+        else:
+            records, _ = _build_clean_records(raw_records, element)
+        mongodb.bulk_upsert_records(clean_collection_name(element), records, ["isin"])
+        tables.update({record["isin"]: record[element] for record in records})
+
+    return {isin: tables[isin] for isin in isins if isin in tables}
+
+
+def _build_clean_records(raw_records: List[Dict[str, Any]], element: str):
+    """Clean raw records one by one, skipping (and counting) the ones that fail."""
+    records: List[Dict[str, Any]] = []
+    failed = 0
+    for raw_record in raw_records:
+        isin = raw_record["isin"]
+        try:
+            records.append(build_clean_record(isin, element, raw_record[element]))
+        except Exception as e:
+            logging.error(f"Failed to clean {element} for ISIN {isin}: {str(e)}")
+            failed += 1
+    return records, failed
+
+
+def _build_clean_records_bulk(raw_records: List[Dict[str, Any]], element: str):
+    """
+    Clean all raw records of a bucketed element in one vectorized pass.
+
+    Falls back to cleaning record by record if the bulk pass fails, so one bad
+    table does not block the others.
+    """
+    try:
+        tables = bulk_to_tables(
+            normalize_bulk(((record["isin"], record[element]) for record in raw_records), element)
+        )
+    except Exception as e:
+        logging.error(f"Bulk cleaning of {element} failed, cleaning record by record: {str(e)}")
+        return _build_clean_records(raw_records, element)
+
+    records = [
+        {
+            "isin": isin,
+            element: to_document(table),
+            "normalization_version": NORMALIZATION_VERSION,
+        }
+        for isin, table in tables.items()
+    ]
+    return records, 0
+
+
+def rematerialize_clean_elements(
+    mongodb: MongoDBUtils,
+    elements: Iterable[str] = ELEMENT_COLLECTIONS,
+    only_stale: bool = True,
+    batch_size: int = 1000
+) -> Dict[str, Dict[str, int]]:
+    """
+    Rebuild the materialized clean collections from the raw elements.
+
+    Args:
+        mongodb (MongoDBUtils): Database handle.
+        elements (Iterable[str]): Element collections to rebuild.
+        only_stale (bool): Only rebuild records that are missing or were built
+            with another NORMALIZATION_VERSION.
+        batch_size (int): Operations per bulk_write call.
+
+    Returns:
+        Dict[str, Dict[str, int]]: Per element, how many raw records were seen,
+        rebuilt and failed to clean.
+    """
+    summary = {}
+    for element in elements:
+        collection_name = clean_collection_name(element)
+        current = set()
+        if only_stale:
+            current = {
+                record["isin"]
+                for record in mongodb.retrieve_record(
+                    collection_name, {"normalization_version": NORMALIZATION_VERSION}
+                )
+            }
+
+        raw_records = mongodb.retrieve_record(element, {})
+        pending = [
+            record for record in raw_records
+            if record.get("isin") is not None and record["isin"] not in current and element in record
+        ]
+        if element in CLASSIFIERS:
+            records, failed = _build_clean_records_bulk(pending, element)
+        else:
+            records, failed = _build_clean_records(pending, element)
+
+        mongodb.bulk_upsert_records(collection_name, records, ["isin"], batch_size=batch_size)
+        summary[element] = {"raw": len(raw_records), "rebuilt": len(records), "failed": failed}
+
+    return summary
@@ -0,0 +1,99 @@
+from typing import Any, Dict, Iterable, List, Optional
+from pipelines.mongo.mongo_utils import MongoDBUtils
+from pipelines.mongo.schema_registry import ELEMENT_COLLECTIONS
+from pipelines.orchestration.clean_elements import get_clean_elements
+
+
+# Most ETFs a single comparison may include
+COMPARE_MAX_ISINS = 50
+
+# Time series collections that can be compared, with the field compared per date
+SERIES_FIELDS = {
+    "etf_daily_prices": "Close",
+    "etf_dividends_issued": "Dividends",
+}
+
+
+def _as_mapping(table: Any, element: str) -> Dict[str, Any]:
+    """Clean tables are label -> value dicts, except pass-through ones stored as rows."""
+    if isinstance(table, dict):
+        return table
+    if isinstance(table, list):
+        return {row.get(element): row.get("Value") for row in table if isinstance(row, dict)}
+    return {}
+
+
+def merge_element_tables(tables: Dict[str, Any], element: str, isins: Optional[List[str]] = None) -> List[Dict[str, Any]]:
+    """
+    Outer-join clean element tables of several ETFs on their labels.
+
+    Args:
+        tables (Dict[str, Any]): ISIN to clean table.
+        element (str): Element name, used as the label column.
+        isins (Optional[List[str]]): Columns to return, defaults to the keys of tables.
+
+    Returns:
+        List[Dict[str, Any]]: One row per label, in order of first appearance,
+        with one column per ISIN (None where the ETF lacks the label).
+    """
+    isins = list(tables) if isins is None else isins
+    rows: Dict[Any, Dict[str, Any]] = {}
+    for isin, table in tables.items():
+        for label, value in _as_mapping(table, element).items():
+            rows.setdefault(label, {})[isin] = value
+    return [{element: label, **{isin: row.get(isin) for isin in isins}} for label, row in rows.items()]
+
+
+def merge_series(isins: List[str], collection_name: str, mongodb: MongoDBUtils) -> List[Dict[str, Any]]:
+    """
+    Read a time series collection for several ETFs with one $in query and pivot it by date.
+
+    Returns:
+        List[Dict[str, Any]]: One row per date, ascending, with one column per ISIN.
+    """
+    field = SERIES_FIELDS[collection_name]
+    records = mongodb.retrieve_records_in(
+        collection_name, "isin", isins, projection={"isin": 1, "date": 1, field: 1}, sort=[("date", 1)]
+    )
+    rows: Dict[Any, Dict[str, Any]] = {}
+    for record in records:
+        rows.setdefault(record.get("date"), {})[record["isin"]] = record.get(field)
+    return [{"date": date, **{isin: row.get(isin) for isin in isins}} for date, row in rows.items()]
+
+
+def compare_etfs(isins: Iterable[str], elements: Iterable[str], mongodb: MongoDBUtils) -> Dict[str, List[Dict[str, Any]]]:
+    """
+    Comparison-ready tables of several ETFs, one per element.
+
+    Each element costs a single $in query whatever the number of ETFs. Element
+    collections (maturity, credit_rate, ...) come back as label rows, time
+    series collections (SERIES_FIELDS) as date rows.
+
+    Args:
+        isins (Iterable[str]): ETFs to compare, at most COMPARE_MAX_ISINS.
+        elements (Iterable[str]): Element or time series collections.
+        mongodb (MongoDBUtils): Database handle.
+
+    Returns:
+        Dict[str, List[Dict[str, Any]]]: Element to merged table records.
+
+    Raises:
+        ValueError: On an unknown element or too many ISINs.
+    """
+    isins = list(dict.fromkeys(isins))
+    if len(isins) > COMPARE_MAX_ISINS:
+        raise ValueError(f"At most {COMPARE_MAX_ISINS} ISINs can be compared, got {len(isins)}")
+
+    elements = list(dict.fromkeys(elements))
+    valid = ELEMENT_COLLECTIONS + list(SERIES_FIELDS)
+    unknown = [element for element in elements if element not in valid]
+    if unknown:
+        raise ValueError(f"Invalid elements: {unknown}. Valid options: {valid}")
+
+    comparison = {}
+    for element in elements:
+        if element in SERIES_FIELDS:
+            comparison[element] = merge_series(isins, element, mongodb)
+        else:
+            comparison[element] = merge_element_tables(get_clean_elements(isins, element, mongodb), element, isins)
+    return comparison
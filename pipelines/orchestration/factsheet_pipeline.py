@@ -0,0 +1,401 @@
+import argparse
+import os
+import queue
+import threading
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional
+import requests
+from pipelines.extraction.extract_etfs_factsheet import RASTERIZE_FACTSHEETS, RASTER_DPI
+from pipelines.extraction.factsheet_store import (
+    FactsheetDownload,
+    fetch_factsheet,
+    is_factsheet_parsed,
+    is_factsheet_processed,
+    mark_factsheet_parsed,
+    mark_factsheet_processed,
+    publish_factsheet,
+    write_factsheet_blob,
+)
+from pipelines.general.filesystem_utils import FS_PATH, JSON_PATH
+from pipelines.general.ref_data import get_etf_ref_data
+from pipelines.mongo.etf_status import log_etfs_info_status
+from pipelines.mongo.mongo_utils import MongoDBUtils
+from pipelines.mongo.schema_registry import ELEMENT_COLLECTIONS
+from pipelines.orchestration.factsheet_processing import extract_element_and_insert_into_mongo
+from pipelines.transform.parser_utils import parse_pdf_document, save_json_to_file
+from pipelines.transform.process_json_data import ParsedFactsheet
+
+
+_DONE = object()
+
+
+@dataclass
+class Stage:
+    """
+    One step of a StagedPipeline.
+
+    Args:
+        name (str): Stage name used in the report.
+        func (Callable[[Any], Any]): Receives an item and returns it for the next stage.
+            Must be a picklable module-level function when ``use_processes`` is set.
+        workers (int): Items processed concurrently by this stage.
+        use_processes (bool): Run ``func`` on a process pool (CPU-bound work)
+            instead of the stage's worker threads (network-bound work).
+        skip (Optional[Callable[[Any], bool]]): Items for which this returns True
+            bypass the stage.
+    """
+    name: str
+    func: Callable[[Any], Any]
+    workers: int = 1
+    use_processes: bool = False
+    skip: Optional[Callable[[Any], bool]] = None
+
+
+@dataclass
+class StageStats:
+    name: str
+    workers: int
+    processed: int = 0
+    skipped: int = 0
+    failed: int = 0
+    busy_seconds: float = 0.0
+    first_started: Optional[float] = None
+    last_finished: Optional[float] = None
+    failures: Dict[str, str] = field(default_factory=dict)
+
+    @property
+    def throughput(self) -> float:
+        """Items per second over the time the stage was active."""
+        if self.first_started is None or self.last_finished is None:
+            return 0.0
+        elapsed = self.last_finished - self.first_started
+        return self.processed / elapsed if elapsed > 0 else 0.0
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "stage": self.name, "workers": self.workers, "processed": self.processed,
+            "skipped": self.skipped, "failed": self.failed,
+            "busy_seconds": round(self.busy_seconds, 3),
+            "throughput_per_s": round(self.throughput, 3), "failures": self.failures,
+        }
+
+
+class StagedPipeline:
+    """
+    Runs items through a chain of stages connected by bounded queues.
+
+    Every stage has its own worker threads, so a slow stage only holds back the
+    items queued in front of it. An item whose stage raises is dropped, recorded
+    in that stage's stats and reported to ``on_failure``.
+    """
+
+    def __init__(
+        self,
+        stages: List[Stage],
+        queue_size: int = 8,
+        key: Callable[[Any], str] = str,
+        on_failure: Optional[Callable[[Any, str, Exception], None]] = None,
+    ):
+        self.stages = stages
+        self.queue_size = queue_size
+        self.key = key
+        self.on_failure = on_failure
+        self.stats = [StageStats(stage.name, stage.workers) for stage in stages]
+        self._lock = threading.Lock()
+
+    def run(self, items: List[Any]) -> List[Any]:
+        """Process all items and return the ones that went through every stage."""
+        queues = [queue.Queue(maxsize=self.queue_size) for _ in self.stages]
+        results = []
+        pools = [
+            ProcessPoolExecutor(max_workers=stage.workers) if stage.use_processes else None
+            for stage in self.stages
+        ]
+
+        threads = []
+        for i, stage in enumerate(self.stages):
+            out_queue = queues[i + 1] if i + 1 < len(self.stages) else None
+            stage_threads = [
+                threading.Thread(
+                    target=self._worker,
+                    args=(stage, self.stats[i], pools[i], queues[i], out_queue, results),
+                    name=f"{stage.name}-{n}",
+                    daemon=True,
+                )
+                for n in range(stage.workers)
+            ]
+            for thread in stage_threads:
+                thread.start()
+            threads.append(stage_threads)
+
+        try:
+            for item in items:
+                queues[0].put(item)
+
+            # Close the stages in order: once every worker of a stage has exited,
+            # everything it produced is already queued for the next one
+            for i, stage in enumerate(self.stages):
+                for _ in range(stage.workers):
+                    queues[i].put(_DONE)
+                for thread in threads[i]:
+                    thread.join()
+        finally:
+            for pool in pools:
+                if pool is not None:
+                    pool.shutdown()
+
+        return results
+
+    def report(self) -> List[Dict[str, Any]]:
+        return [stats.as_dict() for stats in self.stats]
+
+    def _worker(self, stage: Stage, stats: StageStats, pool, in_queue, out_queue, results):
+        while True:
+            item = in_queue.get()
+            if item is _DONE:
+                return
+
+            # Nothing raised here may end the loop: a dead worker leaves its
+            # queue full and run() blocked on put
+            try:
+                skipped = stage.skip is not None and stage.skip(item)
+            except Exception as e:
+                print(traceback.format_exc())
+                self._fail(item, stage, stats, e)
+                continue
+            if skipped:
+                with self._lock:
+                    stats.skipped += 1
+                self._forward(item, out_queue, results)
+                continue
+
+            started = time.perf_counter()
+            with self._lock:
+                if stats.first_started is None:
+                    stats.first_started = started
+            try:
+                if pool is not None:
+                    item = pool.submit(stage.func, item).result()
+                else:
+                    item = stage.func(item)
+                failed = None
+            except Exception as e:
+                print(traceback.format_exc())
+                failed = e
+
+            finished = time.perf_counter()
+            with self._lock:
+                stats.busy_seconds += finished - started
+                stats.last_finished = finished
+                if failed is None:
+                    stats.processed += 1
+
+            if failed is None:
+                self._forward(item, out_queue, results)
+            else:
+                self._fail(item, stage, stats, failed)
+
+    def _fail(self, item, stage: Stage, stats: StageStats, error: Exception):
+        """Count a failed item and report it, without letting on_failure raise."""
+        with self._lock:
+            stats.failed += 1
+            stats.failures[self.key(item)] = str(error)
+        if self.on_failure is None:
+            return
+        try:
+            self.on_failure(item, stage.name, error)
+        except Exception:
+            print(traceback.format_exc())
+
+    def _forward(self, item, out_queue, results):
+        if out_queue is None:
+            with self._lock:
+                results.append(item)
+        else:
+            out_queue.put(item)
+
+
+@dataclass
+class FactsheetTask:
+    isin: str
+    download: Optional[FactsheetDownload] = None
+
+    @property
+    def pdf_path(self) -> str:
+        return f"{FS_PATH}{self.isin}_factsheet.pdf"
+
+    @property
+    def json_path(self) -> str:
+        return f"{JSON_PATH}{self.isin}_factsheet.json"
+
+    @property
+    def changed(self) -> bool:
+        """Whether a new version of the factsheet was downloaded."""
+        return self.download is not None and self.download.changed
+
+
+def store_stage(task: FactsheetTask) -> FactsheetTask:
+    write_factsheet_blob(task.download, rasterize=False)
+    return task
+
+
+@dataclass
+class RasterizeStage:
+    """Picklable stage function rasterizing at a given DPI."""
+    dpi: int = RASTER_DPI
+
+    def __call__(self, task: FactsheetTask) -> FactsheetTask:
+        # The stage already runs on a process pool, render the pages in that worker
+        write_factsheet_blob(task.download, rasterize=True, dpi=self.dpi, max_workers=1)
+        return task
+
+
+def build_factsheet_pipeline(
+    mongodb: MongoDBUtils,
+    fetch_workers: int = 4,
+    rasterize_workers: int = os.cpu_count() or 1,
+    parse_workers: int = 2,
+    extract_workers: int = 2,
+    queue_size: int = 8,
+    rasterize: bool = RASTERIZE_FACTSHEETS,
+    dpi: int = RASTER_DPI,
+    force: bool = False,
+) -> StagedPipeline:
+    """
+    Builds the staged pipeline that processes factsheets for many ISINs.
+
+    Stages: check the factsheet against the store (justETF link then a
+    conditional GET), write a new version under its SHA-256 (rasterized at
+    ``dpi`` on a process pool when ``rasterize`` is set), point
+    {isin}_factsheet.pdf at it, parse it with LlamaParse, then extract the
+    elements and upsert them. Unchanged factsheets skip every stage after the
+    check, as in process_factsheet, unless ``force`` is set.
+    """
+    def fetch_stage(task: FactsheetTask) -> FactsheetTask:
+        try:
+            task.download = fetch_factsheet(task.isin, mongodb, force=force)
+        except (LookupError, requests.RequestException):
+            # Fall back to what is on disk, if anything
+            if not (os.path.exists(task.pdf_path) or os.path.exists(task.json_path)):
+                raise
+        return task
+
+    def publish_stage(task: FactsheetTask) -> FactsheetTask:
+        publish_factsheet(task.download, mongodb)
+        return task
+
+    def unchanged(task: FactsheetTask) -> bool:
+        return not task.changed
+
+    def parsed(task: FactsheetTask) -> bool:
+        # The JSON must come from the stored version, not only exist
+        if task.changed or not os.path.exists(task.json_path):
+            return False
+        return task.download is None or is_factsheet_parsed(mongodb, task.isin, task.download.sha256)
+
+    def parse_stage(task: FactsheetTask) -> FactsheetTask:
+        json_data = parse_pdf_document(task.isin)
+        save_json_to_file(json_data, task.isin)
+        if task.download is not None:
+            mark_factsheet_parsed(mongodb, task.isin, task.download.sha256)
+        return task
+
+    def extracted(task: FactsheetTask) -> bool:
+        return (parsed(task) and task.download is not None
+                and is_factsheet_processed(mongodb, task.isin, task.download.sha256))
+
+    def extract_stage(task: FactsheetTask) -> FactsheetTask:
+        factsheet = ParsedFactsheet.from_file(task.json_path)
+        for element in ELEMENT_COLLECTIONS:
+            extract_element_and_insert_into_mongo(task.isin, element, task.json_path, mongodb, factsheet)
+        log_etfs_info_status(mongodb, task.isin, "process_fs_data")
+        if task.download is not None:
+            mark_factsheet_processed(mongodb, task.isin, task.download.sha256)
+        return task
+
+    def on_failure(task: FactsheetTask, stage: str, error: Exception):
+        log_etfs_info_status(mongodb, task.isin, "process_fs_data", f"{stage} failed: {error}")
+
+    stages = [
+        Stage("fetch", fetch_stage, fetch_workers),
+        Stage("rasterize", RasterizeStage(dpi), rasterize_workers, use_processes=True, skip=unchanged)
+        if rasterize else Stage("store", store_stage, skip=unchanged),
+        Stage("publish", publish_stage, skip=unchanged),
+        Stage("parse", parse_stage, parse_workers, skip=parsed),
+        Stage("extract", extract_stage, extract_workers, skip=extracted),
+    ]
+    return StagedPipeline(stages, queue_size=queue_size, key=lambda task: task.isin, on_failure=on_failure)
+
+
+def process_factsheets_bulk(mongodb: MongoDBUtils, isins: List[str], **pipeline_options) -> Dict[str, Any]:
+    """
+    Processes the factsheets of many ISINs concurrently.
+
+    Returns:
+        Dict[str, Any]: Succeeded ISINs, those whose factsheet changed,
+        per-stage report, the wall time and peak RSS of storing each new
+        PDF, and total wall time.
+    """
+    started = time.perf_counter()
+    pipeline = build_factsheet_pipeline(mongodb, **pipeline_options)
+    completed = pipeline.run([FactsheetTask(isin) for isin in isins])
+    return {
+        "submitted": len(isins),
+        "succeeded": sorted(task.isin for task in completed),
+        "stages": pipeline.report(),
+        "changed": sorted(task.isin for task in completed if task.changed),
+        "store_metrics": {
+            task.isin: task.download.store_metrics
+            for task in completed if task.download is not None and task.download.store_metrics
+        },
+        "total_seconds": round(time.perf_counter() - started, 3),
+    }
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Process ETF factsheets for many ISINs concurrently.")
+    parser.add_argument("isins", nargs="*", help="ISINs to process (default: every ETF in etfs_ref_data.csv)")
+    parser.add_argument("--fetch-workers", type=int, default=4)
+    parser.add_argument("--rasterize-workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--parse-workers", type=int, default=2)
+    parser.add_argument("--extract-workers", type=int, default=2)
+    parser.add_argument("--queue-size", type=int, default=8)
+    parser.add_argument("--rasterize", action="store_true", default=RASTERIZE_FACTSHEETS,
+                        help="Store image-only PDFs instead of the downloaded files")
+    parser.add_argument("--dpi", type=int, default=RASTER_DPI)
+    parser.add_argument("--force", action="store_true", help="Reprocess factsheets even if unchanged")
+    args = parser.parse_args()
+
+    isins = args.isins or get_etf_ref_data().isins()
+
+    mongodb = MongoDBUtils()
+    try:
+        mongodb.ensure_indexes()
+        summary = process_factsheets_bulk(
+            mongodb,
+            isins,
+            fetch_workers=args.fetch_workers,
+            rasterize_workers=args.rasterize_workers,
+            parse_workers=args.parse_workers,
+            extract_workers=args.extract_workers,
+            queue_size=args.queue_size,
+            rasterize=args.rasterize,
+            dpi=args.dpi,
+            force=args.force,
+        )
+    finally:
+        mongodb.close_connection()
+
+    for stage in summary["stages"]:
+        print(f"{stage['stage']:<10} workers={stage['workers']:<3} processed={stage['processed']:<5} "
+              f"skipped={stage['skipped']:<5} failed={stage['failed']:<5} "
+              f"busy={stage['busy_seconds']:>9.1f}s throughput={stage['throughput_per_s']:.2f}/s")
+        for isin, error in stage["failures"].items():
+            print(f"    {isin}: {error}")
+    for isin, metrics in summary["store_metrics"].items():
+        print(f"{isin}: {metrics}")
+    print(f"{len(summary['succeeded'])}/{summary['submitted']} factsheets processed "
+          f"({len(summary['changed'])} changed) in {summary['total_seconds']}s")
@@ -0,0 +1,135 @@
+import logging
+import os
+from typing import Optional
+import requests
+from pymongo.results import UpdateResult
+from pipelines.extraction.factsheet_store import (
+    is_factsheet_parsed,
+    is_factsheet_processed,
+    mark_factsheet_parsed,
+    mark_factsheet_processed,
+    refresh_factsheet,
+)
+from pipelines.general.filesystem_utils import FS_PATH, JSON_PATH
+from pipelines.mongo.etf_status import log_etfs_info_status
+from pipelines.mongo.mongo_utils import MongoDBUtils
+from pipelines.mongo.schema_registry import ELEMENT_COLLECTIONS
+from pipelines.orchestration.clean_elements import materialize_clean_element
+from pipelines.transform.parser_utils import parse_pdf_document, save_json_to_file
+from pipelines.transform.process_json_data import ELEMENT_FIELDS, ParsedFactsheet
+
+
+def extract_element_and_insert_into_mongo(
+    isin: str, element: str, json_save_path: str, mongodb: MongoDBUtils,
+    factsheet: Optional[ParsedFactsheet] = None
+) -> UpdateResult:
+    """
+    Extracts a specified element from a JSON file and upserts it into MongoDB,
+    along with its cleaned version in the matching *_clean collection.
+
+    Args:
+        isin (str): The ISIN code for the record.
+        element (str): Element type to extract (e.g., "maturity", "sector").
+        json_save_path (str): Path to the JSON file containing the data.
+        mongodb (MongoDBUtils): Database handle.
+        factsheet (Optional[ParsedFactsheet]): The already parsed JSON file, so
+            extracting several elements reads it once. Loaded from
+            json_save_path when omitted.
+
+    Returns:
+        UpdateResult: MongoDB upsert result.
+
+    Raises:
+        ValueError: For invalid element types or extraction errors.
+        RuntimeError: For MongoDB operation failures.
+    """
+    # Validate element early
+    if element not in ELEMENT_FIELDS:
+        raise ValueError(
+            f"Invalid element: {element}. Valid options: {list(ELEMENT_FIELDS.keys())}"
+        )
+
+    result = None
+
+    try:
+        # Extract data
+        if factsheet is None:
+            factsheet = ParsedFactsheet.from_file(json_save_path)
+        extracted_data = factsheet.extract(ELEMENT_FIELDS[element])
+        if not extracted_data:
+            logging.error(f"No data extracted for {element} from {json_save_path}")
+
+        # Prepare and upsert record
+        record_data = {"isin": isin, element: extracted_data or {}}
+        result = mongodb.upsert_record(
+            collection_name=element,
+            record=record_data,
+            unique_keys=["isin"],  # Upsert based on ISIN
+        )
+
+        logging.info(f"Upserted {element} for ISIN {isin}: {result.raw_result}")
+
+        # Clean once here so reads of the clean element are plain lookups
+        materialize_clean_element(isin, element, record_data[element], mongodb)
+        return result
+
+    except Exception as e:
+        logging.error(f"Failed to process {element} for ISIN {isin}: {str(e)}")
+        raise RuntimeError(f"Operation failed: {str(e)}") from e
+
+
+def process_factsheet(isin: str, mongodb: MongoDBUtils, force: bool = False) -> str:
+    """
+    Downloads, parses and extracts the factsheet of an ISIN into MongoDB.
+
+    The factsheet is refreshed through the store with a conditional GET. When
+    its content is unchanged and was already extracted, parsing and
+    extraction are skipped. If the refresh fails, the PDF or parsed JSON
+    already on disk are used. This runs as a background job behind the
+    /process_fs_data endpoint.
+
+    Args:
+        isin (str): The ISIN to process.
+        mongodb (MongoDBUtils): Database handle.
+        force (bool): Download, parse and extract even if nothing changed.
+
+    Raises:
+        FileNotFoundError: When no factsheet could be found for the ISIN.
+    """
+    pdf_path = f"{FS_PATH}{isin}_factsheet.pdf"
+    json_save_path = f"{JSON_PATH}{isin}_factsheet.json"
+
+    download = None
+    try:
+        download = refresh_factsheet(isin, mongodb, force=force)
+    except (LookupError, ValueError, requests.RequestException) as e:
+        logging.warning(f"Factsheet refresh failed for ISIN {isin}: {str(e)}")
+
+    # Parse when the JSON is missing or does not come from the stored version,
+    # e.g. because parsing failed after the new version was published
+    needs_parse = not os.path.exists(json_save_path) or (
+        download is not None and (download.changed or not is_factsheet_parsed(mongodb, isin, download.sha256))
+    )
+
+    if not needs_parse and download is not None and is_factsheet_processed(mongodb, isin, download.sha256):
+        return "ETF Factsheet unchanged"
+
+    if needs_parse and os.path.exists(pdf_path):
+        json_data = parse_pdf_document(isin)
+        save_json_to_file(json_data, isin)
+        if download is not None:
+            mark_factsheet_parsed(mongodb, isin, download.sha256)
+
+    elif not os.path.exists(json_save_path):
+        log_etfs_info_status(mongodb, isin, "process_fs_data", "No data found")
+        raise FileNotFoundError("FactSheet EN or DE not found")
+
+    # Extract and insert data elements into MongoDB, reading the JSON once
+    factsheet = ParsedFactsheet.from_file(json_save_path)
+    for element in ELEMENT_COLLECTIONS:
+        extract_element_and_insert_into_mongo(isin, element, json_save_path, mongodb, factsheet)
+
+    log_etfs_info_status(mongodb, isin, "process_fs_data")
+    if download is not None:
+        mark_factsheet_processed(mongodb, isin, download.sha256)
+    return "ETF Factsheet Processed"
@@ -0,0 +1,123 @@
+import os
+import threading
+import traceback
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, Optional
+from pipelines.mongo.mongo_utils import MongoDBUtils
+
+
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", 2))
+
+QUEUED, RUNNING, SUCCEEDED, FAILED = "queued", "running", "succeeded", "failed"
+
+
+class JobQueue:
+    """
+    Background job runner persisted in MongoDB.
+
+    Jobs are identified by a ``kind`` (the registered handler) and a ``key``
+    (usually an ISIN). Submitting a job while another one with the same kind and
+    key is queued or running returns the in-flight job instead of starting a new
+    one. Job documents live in the ``jobs`` collection, so unfinished jobs can be
+    picked up again by ``recover`` after a restart.
+    """
+
+    def __init__(self, mongodb: MongoDBUtils, max_workers: int = JOB_WORKERS, collection_name: str = "jobs"):
+        self.mongodb = mongodb
+        self.collection_name = collection_name
+        self._handlers: Dict[str, Callable[[str], Any]] = {}
+        self._in_flight: Dict[tuple, str] = {}
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="job")
+
+    def register(self, kind: str, handler: Callable[[str], Any]):
+        """Register the function run for jobs of the given kind; it receives the job key."""
+        self._handlers[kind] = handler
+
+    def submit(self, kind: str, key: str) -> Dict[str, Any]:
+        """
+        Queue a job, or return the in-flight job with the same kind and key.
+
+        Returns:
+            Dict[str, Any]: The job document.
+        """
+        if kind not in self._handlers:
+            raise ValueError(f"Unknown job kind: {kind}. Valid options: {list(self._handlers.keys())}")
+
+        with self._lock:
+            job_id = self._in_flight.get((kind, key))
+            if job_id is not None:
+                return self.get(job_id)
+
+            job = {
+                "job_id": uuid.uuid4().hex,
+                "kind": kind,
+                "key": key,
+                "status": QUEUED,
+                "submitted_at": datetime.now(timezone.utc),
+                "started_at": None,
+                "finished_at": None,
+                "result": None,
+                "error": None,
+            }
+            self.mongodb.upsert_record(self.collection_name, job, ["job_id"])
+            self._start(job)
+
+        return self.get(job["job_id"])
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Return the stored job document, or None if the job is unknown."""
+        records = self.mongodb.retrieve_record(self.collection_name, {"job_id": job_id})
+        return records[0] if records else None
+
+    def recover(self) -> int:
+        """
+        Requeue jobs left queued or running by a previous process.
+
+        Returns:
+            int: Number of jobs requeued.
+        """
+        unfinished = self.mongodb.retrieve_record(
+            self.collection_name, {"status": {"$in": [QUEUED, RUNNING]}}
+        )
+        requeued = 0
+        with self._lock:
+            for job in unfinished:
+                if job["kind"] not in self._handlers:
+                    self._update(job["job_id"], status=FAILED, error=f"Unknown job kind: {job['kind']}",
+                                 finished_at=datetime.now(timezone.utc))
+                elif (job["kind"], job["key"]) in self._in_flight:
+                    # Duplicate left behind by an earlier crash
+                    self._update(job["job_id"], status=FAILED, error="Superseded by another job",
+                                 finished_at=datetime.now(timezone.utc))
+                else:
+                    self._update(job["job_id"], status=QUEUED)
+                    self._start(job)
+                    requeued += 1
+        return requeued
+
+    def shutdown(self):
+        """Stop accepting work; running jobs are picked up again by recover on the next start."""
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    def _start(self, job: Dict[str, Any]):
+        # Callers hold self._lock
+        self._in_flight[(job["kind"], job["key"])] = job["job_id"]
+        self._executor.submit(self._run, job["job_id"], job["kind"], job["key"])
+
+    def _run(self, job_id: str, kind: str, key: str):
+        self._update(job_id, status=RUNNING, started_at=datetime.now(timezone.utc))
+        try:
+            result = self._handlers[kind](key)
+            self._update(job_id, status=SUCCEEDED, result=result, finished_at=datetime.now(timezone.utc))
+        except Exception as e:
+            print(traceback.format_exc())
+            self._update(job_id, status=FAILED, error=str(e), finished_at=datetime.now(timezone.utc))
+        finally:
+            with self._lock:
+                self._in_flight.pop((kind, key), None)
+
+    def _update(self, job_id: str, **fields):
+        self.mongodb.upsert_record(self.collection_name, {"job_id": job_id, **fields}, ["job_id"])
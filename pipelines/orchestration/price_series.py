@@ -0,0 +1,175 @@
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+import numpy as np
+import pandas as pd
+from pipelines.extraction.batch_prices import PRICE_COLUMNS
+from pipelines.mongo.mongo_utils import MongoDBUtils
+
+
+# Bar resolutions, each with the pandas offset its bars end on
+FREQUENCIES = {
+    "daily": None,
+    "weekly": pd.offsets.Week(weekday=4),
+    "monthly": pd.offsets.MonthEnd(),
+}
+
+# How each price column is aggregated into a weekly/monthly bar
+OHLC_AGGREGATIONS = {
+    "Open": "first",
+    "High": "max",
+    "Low": "min",
+    "Close": "last",
+    "Volume": "sum",
+    "Dividends": "sum",
+    "Stock Splits": "prod",
+    "Capital Gains": "sum",
+}
+
+
+def load_prices(
+    mongodb: MongoDBUtils,
+    isin: str,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    columns: Optional[List[str]] = None
+) -> pd.DataFrame:
+    """
+    Read the daily prices of an ETF between two dates, only fetching the requested columns.
+
+    Returns:
+        pd.DataFrame: Price columns indexed by date, ascending.
+    """
+    columns = columns or PRICE_COLUMNS
+    query: Dict[str, Any] = {"isin": isin}
+    date_range = {}
+    if start is not None:
+        date_range["$gte"] = start
+    if end is not None:
+        date_range["$lte"] = end
+    if date_range:
+        query["date"] = date_range
+
+    records = mongodb.retrieve_record(
+        "etf_daily_prices", query,
+        projection={"date": 1, **{column: 1 for column in columns}},
+        sort=[("date", 1)]
+    )
+    df = pd.DataFrame(records, columns=["date"] + columns)
+    df["date"] = pd.to_datetime(df["date"])
+    return df.set_index("date")
+
+
+def resample_ohlc(df: pd.DataFrame, frequency: str) -> pd.DataFrame:
+    """
+    Aggregate daily prices into weekly or monthly bars.
+
+    Bars are labelled by their last day (Friday / month end) and periods
+    without any price are dropped.
+    """
+    offset = FREQUENCIES[frequency]
+    if offset is None or df.empty:
+        return df
+    aggregations = {column: OHLC_AGGREGATIONS.get(column, "last") for column in df.columns}
+    resampled = df.resample(offset).agg(aggregations)
+    counts = df.resample(offset).size()
+    return resampled[counts > 0]
+
+
+def lttb_indices(x: np.ndarray, y: np.ndarray, points: int) -> np.ndarray:
+    """
+    Largest-Triangle-Three-Buckets downsampling.
+
+    Keeps the first and last points and, from each of ``points - 2`` equal
+    buckets in between, the point forming the largest triangle with the
+    previously kept point and the average of the next bucket. This preserves
+    the visual shape of a series (peaks, troughs) far better than taking every
+    n-th point.
+
+    Args:
+        x (np.ndarray): Ascending x values.
+        y (np.ndarray): y values, without NaN.
+        points (int): Number of points to keep.
+
+    Returns:
+        np.ndarray: Positions of the kept points, ascending.
+    """
+    n = len(x)
+    if points >= n or points < 3:
+        return np.arange(n)
+
+    edges = np.linspace(1, n - 1, points - 1).astype(int)
+    selected = np.empty(points, dtype=int)
+    selected[0], selected[-1] = 0, n - 1
+    previous = 0
+    for bucket in range(points - 2):
+        start, end = edges[bucket], edges[bucket + 1]
+        next_end = edges[bucket + 2] if bucket + 2 < len(edges) else n
+        next_x, next_y = x[end:next_end].mean(), y[end:next_end].mean()
+        areas = np.abs(
+            (x[previous] - next_x) * (y[start:end] - y[previous])
+            - (x[previous] - x[start:end]) * (next_y - y[previous])
+        )
+        previous = start + int(np.argmax(areas))
+        selected[bucket + 1] = previous
+    return selected
+
+
+def downsample_lttb(df: pd.DataFrame, points: int, value_column: str = "Close") -> pd.DataFrame:
+    """Keep the ``points`` rows LTTB picks on value_column; rows without a value are dropped."""
+    df = df[df[value_column].notna()]
+    if len(df) <= points:
+        return df
+    x = df.index.to_numpy(dtype="datetime64[ns]").astype(np.int64) / 1e9
+    y = df[value_column].to_numpy(dtype=float)
+    return df.iloc[lttb_indices(x, y, points)]
+
+
+def get_price_series(
+    mongodb: MongoDBUtils,
+    isin: str,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    columns: Optional[List[str]] = None,
+    frequency: str = "daily",
+    points: Optional[int] = None,
+    value_column: str = "Close"
+) -> List[Dict[str, Any]]:
+    """
+    Price series of an ETF ready for charting.
+
+    Args:
+        mongodb (MongoDBUtils): Database handle.
+        isin (str): ETF to read.
+        start (Optional[datetime]): First date included.
+        end (Optional[datetime]): Last date included.
+        columns (Optional[List[str]]): Price columns to return, all when None.
+        frequency (str): "daily", "weekly" or "monthly" bars.
+        points (Optional[int]): When set, LTTB-downsample to at most this many
+            rows, so payloads stay the same size whatever the history length.
+        value_column (str): Column the downsampling preserves the shape of.
+
+    Returns:
+        List[Dict[str, Any]]: Records with a date and the requested columns.
+
+    Raises:
+        ValueError: On unknown columns or frequency, or a points count below 3.
+    """
+    columns = list(dict.fromkeys(columns or PRICE_COLUMNS))
+    unknown = [column for column in columns if column not in PRICE_COLUMNS]
+    if unknown:
+        raise ValueError(f"Invalid columns: {unknown}. Valid options: {PRICE_COLUMNS}")
+    if frequency not in FREQUENCIES:
+        raise ValueError(f"Invalid frequency: {frequency}. Valid options: {list(FREQUENCIES)}")
+    if value_column not in PRICE_COLUMNS:
+        raise ValueError(f"Invalid value column: {value_column}. Valid options: {PRICE_COLUMNS}")
+    if points is not None and points < 3:
+        raise ValueError("points must be at least 3")
+
+    # The downsampled column is read even when not returned
+    query_columns = columns if points is None or value_column in columns else columns + [value_column]
+    df = resample_ohlc(load_prices(mongodb, isin, start, end, query_columns), frequency)
+    if points is not None:
+        df = downsample_lttb(df, points, value_column)
+
+    df = df[columns].reset_index()
+    return df.astype(object).where(df.notna(), None).to_dict(orient="records")
@@ -0,0 +1,161 @@
+import re
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+import numpy as np
+import pandas as pd
+
+
+MATURITY_BUCKETS = ['<1 year', '1-5 years', '5-10 years', '10-15 years', '15-20 years', '>20 years']
+RATING_BUCKETS = ['AAA', 'AA', 'A', 'BB', 'BBB', 'Not Rated']
+
+# Lower edges of MATURITY_BUCKETS, used to bucket the start of a "1 - 5 Years" range
+_MATURITY_EDGES = np.array([0, 1, 5, 10, 15, 20])
+
+_RANGE_START = re.compile(r'^\s*(\d+(?:\.\d+)?)\s*-')
+_UNDER = re.compile(r'^\s*(?:under|less than|below|<)', re.IGNORECASE)
+# Open-ended upper labels, capturing N in "Over N" / "> N" / "N+"
+_OVER = re.compile(r'^\s*(?:(?:over|more than|above|>)\s*(\d+(?:\.\d+)?)|(\d+(?:\.\d+)?)\s*\+)', re.IGNORECASE)
+_RATING = re.compile(r'^\s*(AAA|AA|A|BBB|BB)(?=[+\-\s(]|$)')
+_NOT_RATED = re.compile(r'^\s*(?:NOT RATED|NON RATED|UNRATED|NR|N/R)\b')
+_NUMBER = re.compile(r'(-?[\d.]+)')
+
+
+def classify_maturity(labels: pd.Series) -> pd.Series:
+    """
+    Map maturity labels to MATURITY_BUCKETS in one vectorized pass.
+
+    "1 - 5 Years" style ranges are bucketed by their start, "Under 1 Year" /
+    "< 1" go to '<1 year' and "Over 20 Years" / "> 25" / "20+" to '>20 years'.
+    Open-ended labels starting below 20 ("10+ Years", "Over 5 Years") span
+    several buckets, so they are kept as their own bucket like any label
+    matching none of these.
+    """
+    labels = labels.astype(str)
+    buckets = pd.Series(labels.to_numpy(dtype=object), index=labels.index)
+
+    starts = pd.to_numeric(labels.str.extract(_RANGE_START, expand=False), errors='coerce')
+    is_range = starts.notna()
+    positions = np.searchsorted(_MATURITY_EDGES, starts[is_range].to_numpy(), side='right') - 1
+    buckets[is_range] = np.asarray(MATURITY_BUCKETS, dtype=object)[positions]
+
+    buckets[~is_range & labels.str.contains(_UNDER)] = '<1 year'
+    over = labels.str.extract(_OVER)
+    over_starts = pd.to_numeric(over[0].fillna(over[1]), errors='coerce')
+    over_positions = np.searchsorted(_MATURITY_EDGES, over_starts.fillna(-1).to_numpy(), side='right') - 1
+    buckets[~is_range & (over_positions == len(_MATURITY_EDGES) - 1)] = '>20 years'
+    return buckets
+
+
+def classify_rating(labels: pd.Series) -> pd.Series:
+    """
+    Map credit rating labels to RATING_BUCKETS in one vectorized pass.
+
+    Notches ("AA+", "BBB-") and trailing words ("AAA rated") fold into their
+    letter grade and "NR" / "Not Rated" into 'Not Rated'. Other labels are
+    kept, upper-cased, as their own bucket.
+    """
+    labels = labels.astype(str).str.upper().str.strip()
+    buckets = labels.str.extract(_RATING, expand=False)
+    buckets[labels.str.contains(_NOT_RATED)] = 'Not Rated'
+    return buckets.fillna(labels)
+
+
+CLASSIFIERS = {
+    "maturity": (classify_maturity, MATURITY_BUCKETS),
+    "credit_rate": (classify_rating, RATING_BUCKETS),
+}
+
+
+def to_numeric_values(values: pd.Series) -> pd.Series:
+    """Vectorized form of clean_and_convert_values for the 'Value' column."""
+    if pd.api.types.is_numeric_dtype(values):
+        return values.astype(float)
+    values = values.astype(str).str.replace(',', '', regex=False)
+    return pd.to_numeric(values.str.extract(_NUMBER, expand=False), errors='coerce')
+
+
+def bucketize(long_df: pd.DataFrame, element: str, isins: Optional[List[str]] = None) -> pd.DataFrame:
+    """
+    Aggregate a long frame of (isin, label, value) rows into buckets.
+
+    Values of an ISIN summing to less than 10 are taken as fractions and
+    scaled to percentages. Every ISIN gets all standard buckets (0 when absent)
+    followed by the unrecognised labels it actually has.
+
+    Args:
+        long_df (pd.DataFrame): Columns isin, label and value.
+        element (str): "maturity" or "credit_rate".
+        isins (Optional[List[str]]): ISINs to report, including those without
+            rows. Defaults to the ISINs present in long_df.
+
+    Returns:
+        pd.DataFrame: Columns isin, bucket and value.
+    """
+    classify, base_buckets = CLASSIFIERS[element]
+    isins = list(pd.unique(long_df['isin'])) if isins is None else list(dict.fromkeys(isins))
+
+    df = long_df[long_df['label'] != ''].copy()
+    df['value'] = to_numeric_values(df['value']).fillna(0.0)
+    totals = df.groupby('isin', sort=False)['value'].transform('sum')
+    df.loc[totals < 10, 'value'] *= 100
+    df['bucket'] = classify(df['label'])
+
+    is_base = df['bucket'].isin(base_buckets)
+    base = df[is_base]
+    # Categorical keys make the groupby emit every (isin, standard bucket) pair
+    base_sums = base.astype({
+        'isin': pd.CategoricalDtype(isins), 'bucket': pd.CategoricalDtype(base_buckets),
+    }).groupby(['isin', 'bucket'], observed=False)['value'].sum().reset_index()
+    base_sums['rank'] = base_sums['bucket'].cat.codes
+
+    extra = df[~is_base]
+    extra_sums = extra.groupby(['isin', 'bucket'], sort=False)['value'].sum().reset_index()
+    extra_sums['rank'] = len(base_buckets) + pd.factorize(extra_sums['bucket'])[0]
+
+    result = pd.concat(
+        [base_sums.astype({'isin': object, 'bucket': object}), extra_sums], ignore_index=True
+    )
+    result['isin_rank'] = pd.Categorical(result['isin'], categories=isins).codes
+    result = result.sort_values(['isin_rank', 'rank'], kind='stable')
+    return result[['isin', 'bucket', 'value']].reset_index(drop=True)
+
+
+def normalize_bulk(tables: Iterable[Tuple[str, Dict[str, Any]]], element: str) -> pd.DataFrame:
+    """
+    Normalize many ETFs' raw element tables in a single vectorized pass.
+
+    Args:
+        tables (Iterable[Tuple[str, Dict[str, Any]]]): (isin, raw table) pairs,
+            raw tables being the label -> value dicts stored by extraction.
+        element (str): "maturity" or "credit_rate".
+
+    Returns:
+        pd.DataFrame: Long format frame with columns isin, bucket and value.
+    """
+    if element not in CLASSIFIERS:
+        raise ValueError(f"Invalid element: {element}. Valid options: {list(CLASSIFIERS.keys())}")
+
+    all_isins: List[str] = []
+    isins: List[str] = []
+    labels: List[Any] = []
+    values: List[Any] = []
+    for isin, table in tables:
+        table = table or {}
+        all_isins.append(isin)
+        isins.extend([isin] * len(table))
+        labels.extend(table.keys())
+        values.extend(table.values())
+
+    long_df = pd.DataFrame({
+        'isin': pd.Series(isins, dtype=object),
+        'label': pd.Series(labels, dtype=object).astype(str),
+        'value': pd.Series(values, dtype=object),
+    })
+    return bucketize(long_df, element, all_isins)
+
+
+def bulk_to_tables(long_df: pd.DataFrame) -> Dict[str, Dict[str, float]]:
+    """Turn normalize_bulk output back into one bucket -> value dict per ISIN."""
+    tables: Dict[str, Dict[str, float]] = {}
+    for isin, bucket, value in zip(long_df['isin'], long_df['bucket'].astype(str), long_df['value'].astype(float).tolist()):
+        tables.setdefault(isin, {})[bucket] = value
+    return tables
@@ -1,6 +1,12 @@
 import pandas as pd
 from typing import Dict, Callable, Any
-from pycountry import countries
+from pipelines.transform.bulk_normalization import bucketize, bulk_to_tables
+from pipelines.transform.country_matcher import get_country_matcher
+
+
+# Version of the cleaning logic below. Bump it whenever clean_table output changes
+# so the materialized *_clean collections get rebuilt.
+NORMALIZATION_VERSION = 4
 
 
 def clean_and_convert_values(df):
@@ -25,129 +31,61 @@ def clean_and_convert_values(df):
  # Convert to percentage if needed
     return df
 
+def _bucketize_table(df, element):
+    """Run a single table through the vectorized bulk bucketing (see bulk_normalization)."""
+    long_df = pd.DataFrame({'isin': '', 'label': df[element].astype(str), 'value': df['Value']})
+    return bulk_to_tables(bucketize(long_df, element, ['']))['']
+
 def map_to_maturity_ranges(df, element):
     """
-    Map maturity periods in the DataFrame to predefined maturity ranges based on the given dictionary.
+    Map maturity periods in the DataFrame to the predefined maturity ranges.
     
     Args:
-    df (pd.DataFrame): Input DataFrame with 'Maturity' and 'Value' columns.
-    labels_dict (dict): Dictionary mapping maturity ranges to index values.
+    df (pd.DataFrame): Input DataFrame with element and 'Value' columns.
+    element (str): Name of the column holding the maturity labels.
     
     Returns:
-    pd.DataFrame: DataFrame with maturity mapped to predefined ranges.
+    dict: Value per maturity range, unknown labels kept as their own key.
     """
-    # If the sum of values is small (less than 10), assume they're in percentage and convert
-    if df['Value'].sum() < 10:
-        df['Value'] = df['Value'] * 100 
-    labels_dict = {
-    '<1 year': [0], 
-    '1-5 years': [1, 2, 3, 4], 
-    '5-10 years': [5, 6, 7, 8, 9], 
-    '10-15 years': [10, 11, 12, 13, 14], 
-    '15-20 years': [15, 16, 17, 18, 19], 
-    '>20 years': [20]
-    }
-    # Initialize a new dictionary for the aggregated values
-    new_table = {key: 0 for key in labels_dict.keys()}
-    
-    for i in range(len(df)):
-        key = df[element].iloc[i]
-        
-        # Check for ranges (e.g., "1 - 5 Years") and map them to the corresponding group
-        if '-' in key:
-            key_value = int(key.split('-')[0].strip())  # Extract the start of the range
-            new_table_key = [key for key in labels_dict.keys() if key_value in labels_dict[key]]
-        
-        # Handle 'Under 1 Year' or '< 1 Year' as a special case
-        elif key.lower().split(' ')[0].strip() in ['under', '<']:
-            key_value = 0
-            new_table_key = [key for key in labels_dict.keys() if key_value in labels_dict[key]]
-        
-        # Handle 'Over 25 Years' or '> 20 Years' as a special case
-        elif key.lower().split(' ')[0].strip() in ['over', '>', '20+']:
-            key_value = 20
-            new_table_key = [key for key in labels_dict.keys() if key_value in labels_dict[key]]
-        
-        # If the key doesn't match any known ranges, raise a warning and set it to 0
-        else:
-            print(f'Key: {key} is not represented, please add')
-            new_table_key = [key]  # Assign to the unique key
-            new_table[key] = 0
-        
-        # Accumulate the value into the correct maturity range
-        new_table[new_table_key[0]] += df['Value'].iloc[i]
-    
-    # Convert the dictionary back to a DataFrame for return
-    return new_table
+    return _bucketize_table(df, element)
 
 def map_to_rating_ranges(df, element):
     """
-    Map credit ratings in the DataFrame to predefined credit ranges based on the given dictionary.
+    Map credit ratings in the DataFrame to the predefined credit ranges.
     
     Args:
-    df (pd.DataFrame): Input DataFrame with 'Maturity' and 'Value' columns.
-    labels_dict (dict): Dictionary mapping maturity ranges to index values.
+    df (pd.DataFrame): Input DataFrame with element and 'Value' columns.
+    element (str): Name of the column holding the ratings.
     
     Returns:
-    pd.DataFrame: DataFrame with maturity mapped to predefined ranges.
+    dict: Value per rating, unknown ratings kept as their own key.
     """
-    # Initialize a new dictionary for the aggregated values
-    if df['Value'].sum() < 10:
-        df['Value'] = df['Value'] * 100 
-    
-    new_table = {
-    'AAA': 0, 
-    'AA': 0, 
-    'A': 0,
-    'BB': 0,
-    'BBB': 0,
-    'Not Rated': 0, 
-    }
-    
-    for i in range(len(df)):
-        key = df[element].iloc[i].upper()
-        if key in new_table.keys():
-            new_table[key] = df['Value'].iloc[i]
-        elif key.split(' ')[0].strip() in new_table.keys(): # more than one word
-            new_table[key.split(' ')[0].strip()] = df['Value'].iloc[i]
-        else:
-            print(f'{key} not in {new_table.keys()}')
-            new_table[key] = df['Value'].iloc[i]
-    
-    # Convert the dictionary back to a DataFrame for return
-    return new_table
+    return _bucketize_table(df, element)
 
 def map_to_issuers_names(df, element):
     """
-    Map issuers names in the DataFrame to predefined issuers names based on the given dictionary.
+    Map issuers names in the DataFrame to the country they belong to, using the
+    shared country matcher (pycountry names plus COUNTRY_ALIASES).
     
     Args:
-    df (pd.DataFrame): Input DataFrame with 'Maturity' and 'Value' columns.
-    labels_dict (dict): Dictionary mapping maturity ranges to index values.
+    df (pd.DataFrame): Input DataFrame with element and 'Value' columns.
+    element (str): Name of the column holding the issuers.
     
     Returns:
-    pd.DataFrame: DataFrame with maturity mapped to predefined ranges.
+    dict: Value per country; issuers naming no country, or several, are kept as is.
     """
     if df['Value'].sum() < 10:
         df['Value'] = df['Value'] * 100 
     
-    # Initialize a new dictionary for the aggregated values
+    matches = get_country_matcher().find_all_many(df[element])
     df[element] = df[element].str.capitalize()
-    country_names = [country.name for country in countries]
-    issuer_countries = [country for country in country_names if country in str(df[element])]
     labels_dict = {}
-    for i, issuer in enumerate(df[element]):
-        country = [country for country in issuer_countries if country in issuer]
+    for issuer, country, value in zip(df[element], matches, df['Value']):
         if len(country) > 1:
             print(f"Issue: {len(country)} countries found for {issuer}")
-            labels_dict[issuer] = df['Value'].iloc[i]
-        elif len(country) == 1:
-            labels_dict[country[0]] = df['Value'].iloc[i]
-        else:
-            # print(f'Ignoring "{issuer}"...')
-            # not a country, but should be included if there
-            labels_dict[issuer] = df['Value'].iloc[i]
-    # df[element] = new_countries
+        # not a country (or several), but should be included if there
+        key = country[0] if len(country) == 1 else issuer
+        labels_dict[key] = labels_dict.get(key, 0) + value
 
     return labels_dict
 
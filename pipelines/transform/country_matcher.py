@@ -0,0 +1,156 @@
+import re
+import threading
+import unicodedata
+from typing import Dict, Iterable, List, Optional, Tuple
+from pycountry import countries
+
+
+# Issuer spellings that are not a pycountry name, official name or common name.
+# Keys are matched like country names (case-, accent- and punctuation-insensitive).
+COUNTRY_ALIASES = {
+    "United States Treasury": "United States",
+    "US Treasury": "United States",
+    "U.S. Treasury": "United States",
+    "USA": "United States",
+    "U.S.A.": "United States",
+    "Bundesrepublik Deutschland": "Germany",
+    "Deutschland": "Germany",
+    "UK": "United Kingdom",
+    "UK Gilt": "United Kingdom",
+    "Great Britain": "United Kingdom",
+    "Britain": "United Kingdom",
+    "Republique Francaise": "France",
+    "Repubblica Italiana": "Italy",
+    "Buoni Poliennali Del Tes": "Italy",
+    "Reino de Espana": "Spain",
+    "Bonos y Oblig del Estado": "Spain",
+    "Republik Osterreich": "Austria",
+    "Royaume de Belgique": "Belgium",
+    "Koninkrijk Belgie": "Belgium",
+    "Nederlandse Staat": "Netherlands",
+    "Republic of Korea": "Korea, Republic of",
+    "Korea": "Korea, Republic of",
+    "Russia": "Russian Federation",
+    "Turkey": "Türkiye",
+    "Czech Republic": "Czechia",
+    "Vietnam": "Viet Nam",
+}
+
+_NON_ALNUM = re.compile(r'[^0-9a-z]+')
+
+# Memoized texts kept per matcher before the memo is reset
+MATCH_CACHE_SIZE = 100_000
+
+
+def tokenize(text) -> Tuple[str, ...]:
+    """Lower-cased, accent-free alphanumeric tokens of a name ("Türkiye" -> ("turkiye",))."""
+    text = unicodedata.normalize('NFKD', str(text))
+    text = ''.join(char for char in text if not unicodedata.combining(char)).casefold()
+    return tuple(_NON_ALNUM.sub(' ', text).split())
+
+
+class CountryMatcher:
+    """
+    Finds country names inside free-text issuer names.
+
+    Every name is stored as a path of tokens in a trie, so a text is scanned
+    once, trying at each token the longest name starting there. Matching
+    whole tokens keeps "Oman" out of "Romania" and prefers "Papua New Guinea"
+    over "Guinea". Results are memoized per text, which pays off when the same
+    issuers show up across many ETFs.
+    """
+
+    _END = object()
+
+    def __init__(self, names: Dict[str, str]):
+        """
+        Args:
+            names (Dict[str, str]): Name or alias to canonical country name.
+        """
+        self._trie: Dict = {}
+        for name, country in names.items():
+            tokens = tokenize(name)
+            if not tokens:
+                continue
+            node = self._trie
+            for token in tokens:
+                node = node.setdefault(token, {})
+            node.setdefault(self._END, country)
+        self._cache: Dict[str, List[str]] = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_pycountry(cls, aliases: Optional[Dict[str, str]] = None) -> "CountryMatcher":
+        """Build a matcher over pycountry names, official and common names plus aliases."""
+        names = {}
+        for country in countries:
+            for attribute in ('name', 'official_name', 'common_name'):
+                name = getattr(country, attribute, None)
+                if name:
+                    names.setdefault(name, country.name)
+        names.update(COUNTRY_ALIASES if aliases is None else aliases)
+        return cls(names)
+
+    def _scan(self, text: str) -> List[str]:
+        tokens = tokenize(text)
+        found: List[str] = []
+        position = 0
+        while position < len(tokens):
+            node = self._trie
+            match, match_end = None, position
+            for end in range(position, len(tokens)):
+                node = node.get(tokens[end])
+                if node is None:
+                    break
+                if self._END in node:
+                    match, match_end = node[self._END], end + 1
+            if match is None:
+                position += 1
+                continue
+            if match not in found:
+                found.append(match)
+            position = match_end
+        return found
+
+    def find_all(self, text: str) -> List[str]:
+        """
+        Countries mentioned in a text.
+
+        Args:
+            text (str): Free text, typically an issuer name.
+
+        Returns:
+            List[str]: Distinct canonical country names, in order of appearance.
+        """
+        text = str(text)
+        found = self._cache.get(text)
+        if found is None:
+            found = self._scan(text)
+            with self._lock:
+                if len(self._cache) >= MATCH_CACHE_SIZE:
+                    self._cache.clear()
+                self._cache[text] = found
+        return list(found)
+
+    def find_all_many(self, texts: Iterable[str]) -> List[List[str]]:
+        """find_all over many texts, scanning each distinct text once."""
+        return [self.find_all(text) for text in texts]
+
+    def resolve(self, text: str) -> Optional[str]:
+        """The country a text refers to, or None when it names none or several."""
+        found = self.find_all(text)
+        return found[0] if len(found) == 1 else None
+
+
+_country_matcher: Optional[CountryMatcher] = None
+_country_matcher_lock = threading.Lock()
+
+
+def get_country_matcher() -> CountryMatcher:
+    """The shared CountryMatcher, built on first use."""
+    global _country_matcher
+    if _country_matcher is None:
+        with _country_matcher_lock:
+            if _country_matcher is None:
+                _country_matcher = CountryMatcher.from_pycountry()
+    return _country_matcher
@@ -0,0 +1,46 @@
+import yaml
+from typing import Dict, List
+from pipelines.general.file_cache import MtimeCachedFile
+from pipelines.general.filesystem_utils import CODE_PATH
+
+
+FIELD_MAPPINGS_PATH = f'{CODE_PATH}pipelines/ref_data/field_mappings.yaml'
+
+
+def normalize_heading(heading) -> str:
+    """Case- and whitespace-insensitive form of a factsheet heading."""
+    return " ".join(str(heading).split()).casefold()
+
+
+class FieldMappings:
+    """
+    Field aliases from field_mappings.yaml, pre-normalized for lookups.
+
+    ``aliases(field)`` keeps the YAML order, which is the order aliases are
+    tried in.
+    """
+
+    def __init__(self, field_mappings: Dict[str, List[str]]):
+        self._aliases = {
+            field: list(dict.fromkeys(normalize_heading(alias) for alias in aliases or []))
+            for field, aliases in field_mappings.items()
+        }
+
+    @classmethod
+    def from_file(cls, path: str = FIELD_MAPPINGS_PATH) -> "FieldMappings":
+        with open(path, 'r') as file:
+            return cls(yaml.safe_load(file)['field_mappings'])
+
+    def fields(self) -> List[str]:
+        return list(self._aliases)
+
+    def aliases(self, field: str) -> List[str]:
+        return self._aliases[field]
+
+
+_field_mappings = MtimeCachedFile(FIELD_MAPPINGS_PATH, FieldMappings.from_file)
+
+
+def get_field_mappings() -> FieldMappings:
+    """The field mappings, parsed once and reloaded when the YAML file changes."""
+    return _field_mappings.get()
@@ -1,9 +1,8 @@
 import json
 import os
-import yaml
 import pandas as pd
 from functools import partial
-from pipelines.general.filesystem_utils import CODE_PATH
+from pipelines.transform.field_mappings import FieldMappings, get_field_mappings, normalize_heading
 
 
 # Function to load JSON data
@@ -39,17 +38,48 @@ def extract_tables(data, mode='all', heading=''):
 def process_table(data, heading):
     """Process one table from the json, the one that is after the heading
     """
-    with open(f'{CODE_PATH}pipelines/ref_data/field_mappings.yaml', 'r') as file:
-        field_mappings = yaml.safe_load(file)['field_mappings']
-    map_list = field_mappings[heading]
-    for map in map_list:
-        table = extract_tables(data, mode='single', heading=map)
-        if table != -1:
-            break
-    if table == -1:
+    return ParsedFactsheet(data).find_table(heading)
+
+
+class ParsedFactsheet:
+    """
+    A factsheet JSON loaded once, with its tables indexed by heading.
+
+    The heading index is built in a single pass over the pages and keyed by
+    normalized heading, so every element is then resolved with dictionary
+    lookups over its aliases instead of a new walk of the document per alias.
+    """
+
+    def __init__(self, data, field_mappings: FieldMappings = None):
+        self.data = data
+        self.field_mappings = field_mappings if field_mappings is not None else get_field_mappings()
+        self.tables = {}
+        for heading, table in extract_tables(data, mode='all').items():
+            if heading is None:
+                continue
+            # First table under a heading wins, as with an exact heading match
+            self.tables.setdefault(normalize_heading(heading), table)
+
+    @classmethod
+    def from_file(cls, file_path, field_mappings=None):
+        return cls(load_json(file_path), field_mappings)
+
+    def find_table(self, heading):
+        """Return the table of the first alias of ``heading`` found in the factsheet."""
+        for alias in self.field_mappings.aliases(heading):
+            if alias in self.tables:
+                return self.tables[alias]
         return []
-    else: 
-        return table
+
+    def extract(self, field):
+        json_table = self.find_table(field)
+        print(f'Success finding table for {field}: {json_table}')
+        return convert_dict(json_table)
+
+    def extract_performance(self, field):
+        json_table = self.find_table(field)
+        print(f'Success finding table for {field}: {json_table}')
+        return convert_dict_performance(json_table)
 
 
 def convert_dict_performance(table):
@@ -119,17 +149,11 @@ def extract_fields(data):
 
 
 def extract_data(json_file_path: str, field: str):
-    data = load_json(json_file_path)
-    json_table = process_table(data, field)
-    print(f'Success finding table for {field}: {json_table}')
-    return convert_dict(json_table)
+    return ParsedFactsheet.from_file(json_file_path).extract(field)
 
 
 def extract_data_performance(json_file_path: str, field: str):
-    data = load_json(json_file_path)
-    json_table = process_table(data, field)
-    print(f'Success finding table for {field}: {json_table}')
-    return convert_dict_performance(json_table)
+    return ParsedFactsheet.from_file(json_file_path).extract_performance(field)
 
 
 # Create partial functions for each specific extraction
@@ -141,3 +165,12 @@ extract_annualised_performance = partial(extract_data_performance, field="Annual
 extract_maturity = partial(extract_data, field= "Maturity Breakdown")
 extract_portfolio_characteristics = partial(extract_data, field="Portfolio Characteristics")
 
+# Field of the factsheet each element collection is extracted from
+ELEMENT_FIELDS = {
+    "maturity": "Maturity Breakdown",
+    "sector": "Sector Breakdown",
+    "credit_rate": "Credit Rating",
+    "market_allocation": "Market Allocation",
+    "portfolio": "Portfolio Characteristics",
+}
+
@@ -1,62 +1,30 @@
 import streamlit as st
-import requests
 import pandas as pd
 from streamlit_pdf_viewer import pdf_viewer
-from streamlit_utils import get_ref_data_as_df, read_pdf_content, get_collection_data_as_df, FASTAPI_URL, list_of_pdfs_available
+from streamlit_utils import get_etfs_overview, read_pdf_content, FASTAPI_URL, list_of_pdfs_available, get_job, api_post
 
 # Set the page configuration
 st.set_page_config(page_title="BondIA Comparator", page_icon="⚔️", layout="wide")
 
 st.title("Bond ETFs Overview")
 
-# Text input for name filter
-name_filter = st.text_input("Enter name to filter:")
-
-# Fetch and display records
-df_etfs_list = get_ref_data_as_df("etfs_list")
-df_etf_info_status = get_collection_data_as_df("etf_info_status")
-
-
-def status_check(group):
-    # Define the required status value
-    required_status = "Succeeded"
-    
-    # Check if the 'status' column exists in the DataFrame
-    if 'status' not in group.columns:
-        return "Error: Missing required column 'status'"
-
-    # Count the number of elements with the status "Succeeded"
-    succeeded_count = (group['status'] == required_status).sum()  # Count "Succeeded" statuses
-    total_count = group['status'].notna().sum()  # Count non-null statuses
-
-    if total_count == 4:
-        return "Succeeded" if succeeded_count == 4 else "Error Processing"
-    elif total_count < 4:
-        return "Missing elements" if succeeded_count == total_count else "Error Processing"
-    else:
-        return "Error Processing"
-
-
-if  df_etf_info_status.empty:
-    df_etf_info_status = pd.DataFrame({"isin":"","status":"Error"},index=[0])
+# Seconds each extraction request may take (full price histories can be long)
+EXTRACTION_TIMEOUT = 300.0
 
-df_etf_info_status_grouped = (
-    df_etf_info_status
-    .groupby('isin')
-    .apply(status_check)
-    .reset_index(name='status_result')
-)
+# Factsheet jobs started from this page, by ISIN; their status is checked on each rerun
+if "factsheet_jobs" not in st.session_state:
+    st.session_state["factsheet_jobs"] = {}
 
+# Text input for name filter
+name_filter = st.text_input("Enter name to filter:")
 
-df = (
-    df_etfs_list
-    .merge(df_etf_info_status_grouped, on='isin', how='left')
-    .fillna({'status_result': "No Process attempt"})
-)
+# Fetch and display records, status is summarized server-side
+df = get_etfs_overview(name_filter)
+if df.empty:
+    df = pd.DataFrame(columns=["isin", "name", "status_result", "last_updated", "elements"])
 
-# Filter DataFrame based on input (case-insensitive)
-if name_filter:
-    df = df[df['name'].str.contains(name_filter, case=False, na=False)]
+# Per-element breakdown, shown for the selected ETF
+elements_by_isin = dict(zip(df["isin"], df.pop("elements")))
 
 
 df.set_index("isin", inplace=True)
@@ -81,10 +49,14 @@ if selected_row is not None:
 
     options = ["Process Factsheet", "Get Prices and Details"]
 
-    st.dataframe(df_etf_info_status.query(f" isin == '{selected_isin}' "))
+    st.dataframe(
+        pd.DataFrame.from_dict(elements_by_isin.get(selected_isin) or {}, orient="index").rename_axis("element")
+    )
 
 
-    if selected_isin in pdf_records:
+    # Fetched once per run, for both the viewer and the download button
+    pdf_content = read_pdf_content(selected_isin) if selected_isin in pdf_records else None
+    if pdf_content:
         options.extend(["View PDF"])
 
     # Choose an action
@@ -93,45 +65,57 @@ if selected_row is not None:
     if st.button("Perform Action"):
         if action == "View PDF":
             try:
-                pdf_viewer(
-                    read_pdf_content(selected_isin)
-                )  # Assuming this function displays the PDF
+                pdf_viewer(pdf_content)
             except Exception:
                 st.error("Failed to fetch PDF. Please try again.")
 
         if action == "Get Prices and Details":
             try:
                 with st.spinner("Processing... Please wait."):
-                    prices_response = requests.post(
-                        f"{FASTAPI_URL}/extract_info?isin={selected_isin}"
-                    )
-                    dividens_response = requests.post(
-                        f"{FASTAPI_URL}/extract_prices?isin={selected_isin}"
+                    # Prices, dividends and info come from a single ticker fetch on the API
+                    response = api_post(
+                        f"{FASTAPI_URL}/extract_all", selected_isin,
+                        params={"isin": selected_isin}, timeout=EXTRACTION_TIMEOUT
                     )
-                    info_response = requests.post(
-                        f"{FASTAPI_URL}/extract_dividends?isin={selected_isin}"
-                    )
-                    st.text(prices_response.text)
-                    st.text(dividens_response.text)
-                    st.text(info_response.text)
+                    if response.ok:
+                        st.json(response.json())
+                    else:
+                        st.error(f"Request failed: {response.text}")
             except Exception:
-                st.error("Failed to fetch PDF. Please try again.")
+                st.error("Failed to extract prices and details. Please try again.")
 
         elif action == "Process Factsheet":
-            # Show a spinner while processing the request
-            with st.spinner("Processing... Please wait."):
-                process_response = requests.post(
-                    f"{FASTAPI_URL}/process_fs_data", json={"isin": selected_isin}
-                )
+            process_response = api_post(
+                f"{FASTAPI_URL}/process_fs_data", selected_isin, json={"isin": selected_isin}
+            )
+            if process_response.ok:
+                # Processing runs as a background job on the API, its status is shown below
+                st.session_state["factsheet_jobs"][selected_isin] = process_response.json()["job_id"]
+            else:
                 st.text(process_response.text)
 
         else:
             st.warning("Please select a valid action.")
 
-    if selected_isin in pdf_records:
+    job_id = st.session_state["factsheet_jobs"].get(selected_isin)
+    if job_id:
+        job = get_job(job_id)
+        if job and job.get("status") == "succeeded":
+            st.text(job["result"])
+            del st.session_state["factsheet_jobs"][selected_isin]
+        elif job and job.get("status") == "failed":
+            st.error(f"Error processing data: {job['error']}")
+            del st.session_state["factsheet_jobs"][selected_isin]
+        elif job:
+            st.info(f"Factsheet processing {job.get('status', 'queued')}, refresh to check again.")
+            st.button("Refresh status")
+        else:
+            del st.session_state["factsheet_jobs"][selected_isin]
+
+    if pdf_content:
         st.download_button(
             label="Download PDF",
-            data=read_pdf_content(selected_isin),
+            data=pdf_content,
             file_name=f"{selected_isin}_factsheet.pdf",  # Use the selected ISIN for the file name
             mime="application/pdf",  # MIME type for PDF
         )
@@ -2,11 +2,14 @@ import streamlit as st
 import pandas as pd
 import plotly.graph_objects as go
 import plotly.express as px
-from streamlit_utils import (get_etf_element_data_as_df, 
-                            list_of_isins_available, 
-                            get_collection_data_as_df,
-                            get_etf_element_data_clean,
-                            merge_tables
+from streamlit_utils import (list_of_isins_available, 
+                            fan_out,
+                            response_json,
+                            comparison_request,
+                            parse_comparison,
+                            price_series_request,
+                            parse_price_series,
+                            COMPARE_MAX_ISINS
                             )
 
 # Set the page configuration
@@ -24,25 +27,41 @@ list_of_isins = list_of_isins_available()
 
 # Select box for elements
 selected_etfs = st.multiselect(
-    "Select up to 4 ETFs to compare:",
+    "Select ETFs to compare:",
     options=list_of_isins,
-    max_selections=4
+    max_selections=COMPARE_MAX_ISINS
 )
 
-# If elements are selected, create a chart
+# Chart settings: the server only sends the range asked for, at most CHART_POINTS points per ETF
+CHART_POINTS = 500
+col_start, col_end, col_frequency = st.columns(3)
+start_date = col_start.date_input("From", value=None)
+end_date = col_end.date_input("To", value=None)
+frequency = col_frequency.selectbox("Resolution", ["daily", "weekly", "monthly"])
+
+# Every table of the page comes from one /compare request, sent together with
+# the price series of each ETF
+COMPARED_ELEMENTS = ["etf_dividends_issued", "portfolio", "maturity", "credit_rate", "market_allocation"]
+comparison = parse_comparison(None, COMPARED_ELEMENTS)
+price_series = {}
 if selected_etfs:
-    all_prices_df = pd.DataFrame()
-    all_info_df = pd.DataFrame()
+    responses = fan_out(
+        [comparison_request(selected_etfs, COMPARED_ELEMENTS)]
+        + [
+            price_series_request(isin, start=start_date, end=end_date, columns=["Close"], frequency=frequency, points=CHART_POINTS)
+            for isin in selected_etfs
+        ]
+    )
+    comparison = parse_comparison(response_json(responses[0]), COMPARED_ELEMENTS)
+    price_series = {isin: parse_price_series(response_json(response)) for isin, response in zip(selected_etfs, responses[1:])}
 
 fig = go.Figure()
 
 for isin in selected_etfs:
-    prices_df = get_etf_element_data_as_df(isin, "etf_daily_prices")
-    #info_df = get_element_data_as_df(element, "etf_info")
+    prices_df = price_series[isin]
     
-    # Only add a line if both dataframes are not empty
+    # Only add a line if the ETF has prices
     if not prices_df.empty:
-        # Use the element name or ISIN as the label, adjust as needed
         fig.add_trace(
             go.Scatter(
                 x=prices_df['date'],
@@ -66,15 +85,16 @@ if fig.data:
     st.plotly_chart(fig)
 
 
+all_dividends_df = comparison["etf_dividends_issued"]
 for isin in selected_etfs:
-    dividends_df = get_etf_element_data_as_df(isin, "etf_dividends_issued")
+    dividends_df = pd.DataFrame()
+    if isin in all_dividends_df:
+        dividends_df = all_dividends_df[['date', isin]].dropna().rename(columns={isin: 'Dividends'})
     
     if dividends_df.empty:
         dividends_df = pd.DataFrame([{
-            "ticker": "",
             "Dividends": "",
             "date": "",
-            "isin": isin
         }])
     
     st.info(f"Dividends Distributed by ISIN: {isin}")
@@ -85,25 +105,14 @@ compare_button = True
 # Button to fetch the maturity record
 if compare_button and len(selected_etfs) > 0:
     
-    tables_maturity = {}
-    tables_rating = {}
-    tables_market = {}
-    tables_portfolio = {}
-    
-    for isin in selected_etfs:
-        tables_maturity[isin] = get_etf_element_data_clean(isin, "maturity")
-        tables_rating[isin] = get_etf_element_data_clean(isin, "credit_rate")
-        tables_market[isin] = get_etf_element_data_clean(isin, "market_allocation")
-        tables_portfolio[isin] = get_etf_element_data_clean(isin, "portfolio")
-
-    df_merged = merge_tables(tables_portfolio, element='Portfolio')
+    df_merged = comparison["portfolio"].rename(columns={"portfolio": "Portfolio"})
 
     if not df_merged.empty:
         st.write("### Portfolio Characteristics")
         st.dataframe(df_merged)
     
     # Maturity
-    df_merged = merge_tables(tables_maturity, element='Maturity')
+    df_merged = comparison["maturity"].rename(columns={"maturity": "Maturity"})
     # Plot Comparison
     if not df_merged.empty:
         st.write("### Maturity Distribution Comparison")
@@ -118,7 +127,7 @@ if compare_button and len(selected_etfs) > 0:
         st.plotly_chart(fig)
 
     ### RATING
-    df_merged = merge_tables(tables_rating, element='Rating')
+    df_merged = comparison["credit_rate"].rename(columns={"credit_rate": "Rating"})
     # Plot Rating Breakdown
     if not df_merged.empty:
         st.write("### Rating Breakdown Comparison")
@@ -140,7 +149,7 @@ if compare_button and len(selected_etfs) > 0:
 
     ### MARKET ALLOCATION
     # Standardizing Country Names (Removing extra words for consistency)
-    df_merged = merge_tables(tables_market, element='Country')
+    df_merged = comparison["market_allocation"].rename(columns={"market_allocation": "Country"})
     if not df_merged.empty:
         # Plot
         st.write("### Market Allocation Comparison")
@@ -1,15 +1,336 @@
 import streamlit as st
+import json
 import requests
-from functools import partial
+import threading
+from collections import OrderedDict
+import time
+from urllib.parse import parse_qsl, urlencode, urlsplit
+import asyncio
+import httpx
 import pandas as pd
-from typing import Optional, Union, Callable
+from dataclasses import dataclass, replace
+from requests.adapters import HTTPAdapter
+from requests.structures import CaseInsensitiveDict
+from typing import Any, Optional, Union, Callable, Dict, List, Tuple
 
 FASTAPI_URL = "http://fastapi-app:8000"
 
+# fan_out defaults: requests in flight at once and seconds each request may take
+MAX_CONCURRENT_REQUESTS = 8
+REQUEST_TIMEOUT = 30.0
+
+# Seconds a successful GET stays cached, per endpoint; endpoints not listed are never cached
+CACHE_TTLS = {
+    "/etfs_list": 3600,
+    "/country_list_ratings": 3600,
+    "/credit_ratings_guide": 3600,
+    "/interest_rates": 3600,
+    "/country_debt_to_gdp": 3600,
+    "/clean_element": 600,
+    "/element": 600,
+    "/compare": 600,
+    "/price_series": 600,
+    "/read_pdf": 600,
+    "/collection_data": 60,
+    "/etfs_overview": 60,
+    "/pdf-records": 60,
+    "/json-records": 60,
+}
+
+# Most ETFs /compare accepts at once (COMPARE_MAX_ISINS on the API)
+COMPARE_MAX_ISINS = 50
+
+# Bounds of the response cache, and how long expired responses with an ETag are kept for revalidation
+CACHE_MAX_ENTRIES = 256
+CACHE_MAX_BYTES = 64 * 1024 * 1024
+CACHE_STALE_TTL = 3600
+
+# Endpoints answering for every ETF at once, dropped whenever any ETF changes
+ALL_ETFS_ENDPOINTS = {"/collection_data", "/etfs_overview", "/pdf-records", "/json-records"}
+
+
+@dataclass
+class CachedResponse:
+    """
+    Client independent copy of a 200 response, the form the response cache stores.
+
+    Answers the parts of the requests / httpx response API the pages use, so a
+    cached entry reads the same whichever client filled it.
+    """
+    status_code: int
+    headers: CaseInsensitiveDict
+    content: bytes
+    url: str
+
+    @classmethod
+    def from_response(cls, response: Union[requests.Response, httpx.Response]) -> "CachedResponse":
+        return cls(response.status_code, CaseInsensitiveDict(response.headers), response.content, str(response.url))
+
+    @property
+    def ok(self) -> bool:
+        return self.status_code < 400
+
+    @property
+    def text(self) -> str:
+        return self.content.decode("utf-8", errors="replace")
+
+    def json(self) -> Any:
+        return json.loads(self.content)
+
+    def raise_for_status(self):
+        if not self.ok:
+            raise requests.exceptions.HTTPError(f"{self.status_code} Error for url: {self.url}")
+
+
+class ResponseCache:
+    """
+    TTL cache of API responses keyed by endpoint, query parameters and Accept header.
+
+    Entries can be dropped per ISIN, matching the ``isin`` parameter or an
+    ``isins`` comma separated list, so a POST on one ETF leaves the others cached.
+
+    The cache is bounded in entries and in body bytes, evicting the least
+    recently used entries first. Expired entries are evicted on ``set``, except
+    those with an ETag, which stay up to ``stale_ttl`` seconds longer so they
+    can be revalidated.
+    """
+
+    def __init__(self, max_entries: int = CACHE_MAX_ENTRIES, max_bytes: int = CACHE_MAX_BYTES, stale_ttl: float = CACHE_STALE_TTL):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.stale_ttl = stale_ttl
+        self._entries: "OrderedDict[Tuple, Tuple[float, CachedResponse]]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(path: str, params: Dict[str, str], accept: str) -> Tuple:
+        return (path, tuple(sorted(params.items())), accept)
+
+    @staticmethod
+    def _size(response: CachedResponse) -> int:
+        return len(response.content or b"")
+
+    def get(self, key: Tuple, allow_stale: bool = False) -> Optional[CachedResponse]:
+        """Cached response while fresh, or even once expired when allow_stale is set."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or (entry[0] < time.monotonic() and not allow_stale):
+                return None
+            self._entries.move_to_end(key)
+            return entry[1]
+
+    def set(self, key: Tuple, response: CachedResponse, ttl: float):
+        size = self._size(response)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            self._pop(key)
+            self._entries[key] = (time.monotonic() + ttl, response)
+            self._bytes += size
+            self._evict()
+
+    def _pop(self, key: Tuple):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._bytes -= self._size(entry[1])
+
+    def _evict(self):
+        now = time.monotonic()
+        for key, (expires, response) in list(self._entries.items()):
+            keep_until = expires + self.stale_ttl if response.headers.get("ETag") else expires
+            if keep_until < now:
+                self._pop(key)
+        while self._entries and (len(self._entries) > self.max_entries or self._bytes > self.max_bytes):
+            self._pop(next(iter(self._entries)))
+
+    def invalidate_isin(self, isin: str):
+        """Drop the entries about an ISIN plus those covering every ETF."""
+        def affected(key: Tuple) -> bool:
+            path, params, _ = key
+            if path in ALL_ETFS_ENDPOINTS:
+                return True
+            params = dict(params)
+            return params.get("isin") == isin or isin in params.get("isins", "").split(",")
+
+        with self._lock:
+            for key in [key for key in self._entries if affected(key)]:
+                self._pop(key)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+
+@st.cache_resource
+def get_session() -> requests.Session:
+    """Keep-alive session shared by every helper, page and rerun."""
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=4, pool_maxsize=20)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+@st.cache_resource
+def get_response_cache() -> ResponseCache:
+    return ResponseCache()
+
+
+def _cache_key(url: str, params: Optional[Dict[str, Any]], headers: Optional[Dict[str, str]]) -> Tuple[Tuple, Optional[int]]:
+    """Response cache key of a GET and the TTL of its endpoint (None when not cached)."""
+    parts = urlsplit(url)
+    query = dict(parse_qsl(parts.query))
+    query.update({name: str(value) for name, value in (params or {}).items()})
+    return ResponseCache.key(parts.path, query, (headers or {}).get("Accept", "")), CACHE_TTLS.get(parts.path)
+
+
+def _revalidation_headers(key: Tuple, headers: Optional[Dict[str, str]]) -> Tuple[Optional[CachedResponse], Optional[Dict[str, str]]]:
+    """Expired cache entry of a GET, and its headers with If-None-Match when that entry has an ETag."""
+    stale = get_response_cache().get(key, allow_stale=True)
+    if stale is not None and stale.headers.get("ETag"):
+        headers = {**(headers or {}), "If-None-Match": stale.headers["ETag"]}
+    return stale, headers
+
+
+def _cache_response(key: Tuple, ttl: float, response: Any, stale: Optional[CachedResponse]) -> Any:
+    """
+    What a cacheable GET answers: the revalidated entry on a 304, the cached
+    copy of a 200, or any other response as is.
+    """
+    if response.status_code == 304 and stale is not None:
+        get_response_cache().set(key, stale, ttl)
+        return stale
+    if response.status_code == 200:
+        cached = CachedResponse.from_response(response)
+        get_response_cache().set(key, cached, ttl)
+        return cached
+    return response
+
+
+def api_get(url: str, params: Optional[Dict[str, Any]] = None, headers: Optional[Dict[str, str]] = None) -> Union[CachedResponse, requests.Response]:
+    """
+    GET through the shared session, answered from the response cache while fresh.
+
+    Only 200 responses of endpoints listed in CACHE_TTLS are cached, and
+    returned as CachedResponse. An expired response carrying an ETag is
+    revalidated with If-None-Match, and kept for another TTL when the API
+    answers 304.
+    """
+    key, ttl = _cache_key(url, params, headers)
+    if not ttl:
+        return get_session().get(url, params=params, headers=headers)
+
+    response = get_response_cache().get(key)
+    if response is not None:
+        return response
+    stale, headers = _revalidation_headers(key, headers)
+    return _cache_response(key, ttl, get_session().get(url, params=params, headers=headers), stale)
+
+
+def api_post(url: str, isin: str, **kwargs) -> requests.Response:
+    """POST an action about an ISIN and drop that ISIN's cached responses."""
+    try:
+        return get_session().post(url, **kwargs)
+    finally:
+        get_response_cache().invalidate_isin(isin)
+
+
+@dataclass
+class ApiRequest:
+    """One request of a fan_out batch."""
+    method: str
+    url: str
+    params: Optional[Dict[str, Any]] = None
+    json: Optional[Any] = None
+    headers: Optional[Dict[str, str]] = None
+    timeout: float = REQUEST_TIMEOUT
+    isin: Optional[str] = None  # for POSTs, the ISIN whose cached responses are dropped
+
+
+async def _send_all(api_requests: List[ApiRequest], concurrency: int) -> List[Union[httpx.Response, Exception]]:
+    semaphore = asyncio.Semaphore(concurrency)
+    async with httpx.AsyncClient(limits=httpx.Limits(max_connections=concurrency)) as client:
+        async def send(api_request: ApiRequest) -> Union[httpx.Response, Exception]:
+            async with semaphore:
+                try:
+                    return await client.request(
+                        api_request.method,
+                        api_request.url,
+                        params=api_request.params,
+                        json=api_request.json,
+                        headers=api_request.headers,
+                        timeout=api_request.timeout,
+                    )
+                except httpx.HTTPError as e:
+                    return e
+
+        return await asyncio.gather(*(send(api_request) for api_request in api_requests))
+
+
+def fan_out(api_requests: List[ApiRequest], concurrency: int = MAX_CONCURRENT_REQUESTS) -> List[Any]:
+    """
+    Send independent requests concurrently, at most ``concurrency`` at a time.
+
+    GETs go through the response cache like api_get: fresh entries answer
+    directly, expired ones with an ETag are revalidated and successful
+    responses are cached. POSTs drop the cached responses of their ISIN.
+    The wall time is that of the slowest request rather than the sum.
+
+    Args:
+        api_requests (List[ApiRequest]): Requests to send, each with its own timeout.
+        concurrency (int): Most requests in flight at once.
+
+    Returns:
+        List[Any]: One result per request, in the same order: a
+        CachedResponse for cacheable GETs that succeeded, otherwise the httpx
+        response or the exception the request raised.
+    """
+    results: List[Any] = [None] * len(api_requests)
+    pending: List[Tuple[int, ApiRequest]] = []
+    # Cache key, TTL and expired entry of the cacheable GETs sent
+    cacheable: Dict[int, Tuple[Tuple, float, Optional[CachedResponse]]] = {}
+    for position, api_request in enumerate(api_requests):
+        if api_request.method.upper() == "GET":
+            key, ttl = _cache_key(api_request.url, api_request.params, api_request.headers)
+            if ttl:
+                cached = get_response_cache().get(key)
+                if cached is not None:
+                    results[position] = cached
+                    continue
+                stale, headers = _revalidation_headers(key, api_request.headers)
+                cacheable[position] = (key, ttl, stale)
+                api_request = replace(api_request, headers=headers)
+        pending.append((position, api_request))
+
+    if pending:
+        responses = asyncio.run(_send_all([api_request for _, api_request in pending], concurrency))
+        for (position, api_request), response in zip(pending, responses):
+            results[position] = response
+            if position in cacheable and isinstance(response, httpx.Response):
+                key, ttl, stale = cacheable[position]
+                results[position] = _cache_response(key, ttl, response, stale)
+            elif api_request.method.upper() != "GET" and api_request.isin:
+                get_response_cache().invalidate_isin(api_request.isin)
+    return results
+
+
+def response_json(result: Any) -> Optional[Any]:
+    """JSON body of a fan_out result, None (after showing the error) when the request failed."""
+    if isinstance(result, Exception):
+        st.error(f"API request failed: {str(result)}")
+        return None
+    if result.status_code >= 400:
+        st.error(f"API request failed: {result.status_code} for {result.url}")
+        return None
+    return result.json()
+
+
 def fetch_data(url: str) -> Optional[dict]:
     """Base function for API calls with error handling"""
     try:
-        response = requests.get(url)
+        response = api_get(url)
         response.raise_for_status()  # Raise exception for 4xx/5xx errors
         return response.json()
     except requests.exceptions.RequestException as e:
@@ -41,7 +362,7 @@ def get_data(url: str) -> Optional[dict]:
 
 def get_etf_element_data_clean(isin, element):
     # Call the FastAPI endpoint with a GET request
-    response = requests.get(f"{FASTAPI_URL}/clean_element?isin={isin}&element={element}")
+    response = api_get(f"{FASTAPI_URL}/clean_element", params={"isin": isin, "element": element})
 
     if response.status_code == 200:
         record = response.json()
@@ -55,16 +376,47 @@ def get_etf_element_data_clean(isin, element):
         return {}
 
 
-def merge_tables(tables, element):
-    combined_df = None
+def get_etfs_overview(name_filter: str = "") -> pd.DataFrame:
+    """Fetch the ETF list with one summarized processing status per ISIN."""
+    params = {"name": name_filter} if name_filter else {}
+    data = fetch_data(f"{FASTAPI_URL}/etfs_overview?{urlencode(params)}")
+    return pd.DataFrame(data) if data else pd.DataFrame()
+
+
+def comparison_request(isins: List[str], elements: List[str]) -> ApiRequest:
+    return ApiRequest("GET", f"{FASTAPI_URL}/compare", params={"isins": ",".join(isins), "elements": ",".join(elements)})
+
+
+def parse_comparison(data: Optional[dict], elements: List[str]) -> Dict[str, pd.DataFrame]:
+    data = data or {}
+    return {element: pd.DataFrame(data.get(element) or []) for element in elements}
 
-    for isin in tables.keys():
-        df = pd.DataFrame(list(tables[isin].items()), columns=[element, isin])
-        if combined_df is None:
-            combined_df = df
-        else:
-            combined_df = combined_df.merge(df, on=element, how='outer')
-    return combined_df
+
+def price_series_request(
+    isin: str,
+    start=None,
+    end=None,
+    columns: Optional[List[str]] = None,
+    frequency: str = "daily",
+    points: Optional[int] = None
+) -> ApiRequest:
+    params = {"isin": isin, "frequency": frequency}
+    if start:
+        params["start"] = str(start)
+    if end:
+        params["end"] = str(end)
+    if columns:
+        params["columns"] = ",".join(columns)
+    if points:
+        params["points"] = points
+    return ApiRequest("GET", f"{FASTAPI_URL}/price_series", params=params)
+
+
+def parse_price_series(data: Optional[list]) -> pd.DataFrame:
+    df = pd.DataFrame(data) if data else pd.DataFrame()
+    if not df.empty:
+        df["date"] = pd.to_datetime(df["date"])
+    return df
 
 
 def get_element_data(isin: str, element: str) -> Optional[dict]:
@@ -82,11 +434,6 @@ def get_data_as_df(data_fetcher: Callable, *args) -> pd.DataFrame:
     data = data_fetcher(*args)
     return pd.DataFrame(data) if data else pd.DataFrame()
 
-get_collection_data_as_df = partial(get_data_as_df, get_collection_data)
-get_etf_element_data_as_df = partial(get_data_as_df, get_element_data)
-
-
-
 def get_ref_data_as_df(endpoint: str) -> pd.DataFrame:
     """Get reference data from any endpoint as DataFrame"""
     url = f"{FASTAPI_URL}/{endpoint}"
@@ -106,8 +453,21 @@ def list_of_isins_available() -> list:
     data = fetch_data(url)
     return data
 
-def read_pdf_content(isin: str):
-    pdf_response = requests.get(f"{FASTAPI_URL}/read_pdf?isin={isin}")
+def read_pdf_content(isin: str) -> Optional[bytes]:
+    """Factsheet PDF of an ISIN, None when the API has none."""
+    pdf_response = api_get(f"{FASTAPI_URL}/read_pdf", params={"isin": isin})
     if pdf_response.status_code == 200:
-        pdf_content = pdf_response.content
-    return pdf_content
\ No newline at end of file
+        return pdf_response.content
+    return None
+
+
+def get_job(job_id: str) -> Optional[dict]:
+    """
+    Current state of a background job, None when the API cannot tell.
+
+    Once the job has finished, the cached responses of the ISIN it worked on are dropped.
+    """
+    job = fetch_data(f"{FASTAPI_URL}/jobs/{job_id}")
+    if job and job.get("status") in ("succeeded", "failed") and job.get("key"):
+        get_response_cache().invalidate_isin(job["key"])
+    return job